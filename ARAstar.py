@@ -0,0 +1,304 @@
+import math
+import time
+import heapq
+import numpy as np
+
+from Grid import Grid, SearchState, Result, random_raster
+import Astar
+
+'''
+Anytime planning with ARA* (anytime repairing A*)
+
+Astar either finds the shortest path or, past MAX_ITS expansions,
+nothing at all. ARA* runs weighted A* (priority g + epsilon * h) with a
+large epsilon first, which finds a path quickly that costs at most
+epsilon times the shortest, then lowers epsilon step by step while the
+budget lasts. Each round reuses the work of the last one and only
+re-expands the cells whose cost went down, and each gives a better path
+and a tighter bound, until epsilon reaches 1 and the path is the
+shortest.
+
+Budgets are passed to every call, as a time limit in seconds and/or a
+number of expansions. A call for the same start and goal on an
+unchanged board picks up where the last one stopped, so a controller
+with a fixed budget per tick can call plan() every tick and the path
+keeps getting better:
+
+    >>> from ARAstar import ARAstar
+    >>> planner = ARAstar(grid)
+    >>> result = planner.plan([0, 0], [99, 99], time_limit=0.005)
+    >>> result.path, result.cost, result.bound
+
+result.bound is the suboptimality bound: the path costs at most bound
+times the shortest one, 1.0 once it is the shortest.
+
+HOW TO RUN THIS CODE:
+
+    $ python ARAstar.py
+'''
+
+# PARAMETERS
+#############
+EPSILON = 3.0  # heuristic weight of the first round
+EPSILON_STEP = 0.5  # how much the weight drops every round
+#############
+BOARD_SIZE = [1024, 1024]
+TREE_DENSITY = 0.3
+SEED = 0
+TICK = 0.02  # seconds per call in main()
+#############
+
+
+# cost of a path, an (L, 2) array of [r, c] rows
+def path_cost(grid, path):
+    if len(path) < 2:
+        return 0.0
+    diagonal = np.abs(np.diff(path, axis=0)).sum(axis=1) == 2
+    dist = np.where(diagonal, math.sqrt(2.0), 1.0)
+    if grid.weights is not None:
+        w = grid.weights[path[:, 0], path[:, 1]]
+        dist = dist * (w[:-1] + w[1:]) * 0.5
+    return float(dist.sum())
+
+
+class ARAstar:
+    def __init__(self, grid, heuristic=Astar.octile, epsilon=EPSILON, step=EPSILON_STEP):
+        self.grid = grid
+
+        # the heuristic as given, and scaled by the cheapest cell of the
+        # board as of the current query (see restart)
+        self.unscaled = heuristic
+        self.heuristic = Astar.scaled(heuristic, grid.min_weight)
+        self.initial_epsilon = epsilon
+        self.step = step
+
+        # g-costs and prev links, valid for the cells the current query
+        # has reached, and the heuristic of those cells
+        self.state = SearchState(grid.ncells)
+        self.h = np.zeros(grid.ncells)
+
+        # priority queue of (key, cell), key = g + epsilon * h. mark[cell]
+        # is 2 * round while the cell is open and 2 * round + 1 once it is
+        # closed in that round, rounds are numbered across queries so old
+        # marks never match. entries whose cell isn't open with that key
+        # any more are stale and skipped
+        self.open = []
+        self.key = np.zeros(grid.ncells)
+        self.mark = np.zeros(grid.ncells, dtype=np.int64)
+        self.round = 0
+
+        # closed cells whose g went down, to be opened again next round
+        self.incons = []
+
+        # (start cell, goal cell, board version) of the current query
+        self.query = None
+        self.epsilon = epsilon
+
+        # best path found for the current query so far
+        self.path = np.empty((0, 2), dtype=np.intp)
+        self.cost = float("inf")
+        self.bound = float("inf")
+        self.done = False
+
+    # forget the last query and start one from start to goal
+    def restart(self, start, goal):
+        self.state.reset()
+        self.source = self.grid.cell(*start)
+        self.target = self.grid.cell(*goal)
+        self.start = list(start)
+        self.goal = list(goal)
+        self.query = (self.source, self.target, self.grid.version)
+        self.heuristic = Astar.scaled(self.unscaled, self.grid.min_weight)
+        self.epsilon = self.initial_epsilon
+        self.path = np.empty((0, 2), dtype=np.intp)
+        self.cost = float("inf")
+        self.bound = float("inf")
+        self.done = False
+
+        self.round += 1
+        self.incons = []
+        self.open = []
+        if self.grid.blocked[self.source] or self.grid.blocked[self.target]:
+            self.done = True
+            return
+
+        self.state.cost[self.source] = 0.0
+        self.state.prev[self.source] = -1
+        self.state.stamp[self.source] = self.state.epoch
+        self.h[self.source] = self.heuristic(start[0], start[1], goal)
+        self.key[self.source] = self.epsilon * self.h[self.source]
+        self.mark[self.source] = 2 * self.round
+        self.open.append((self.key[self.source], self.source))
+
+    # weighted A* with the current epsilon until the goal's g is no more
+    # than the smallest key on the open set, the budget runs out
+    # ("budget") or the open set does ("exhausted"). returns what
+    # happened and how many cells were expanded
+    def improvePath(self, deadline, max_its):
+        epoch = self.state.epoch
+        cost = memoryview(self.state.cost)
+        prev = memoryview(self.state.prev)
+        stamp = memoryview(self.state.stamp)
+        h = memoryview(self.h)
+        key = memoryview(self.key)
+        mark = memoryview(self.mark)
+        moves = self.grid.moves
+        nbmask = self.grid._nbmask
+        weights = self.grid._weights
+        ncols = self.grid.ncols
+        heuristic = self.heuristic
+        goal = self.goal
+        target = self.target
+        epsilon = self.epsilon
+        open_mark = 2 * self.round
+        closed_mark = open_mark + 1
+        open_set = self.open
+        incons = self.incons
+        nits = 0
+
+        while open_set:
+            k, cell = open_set[0]
+            if mark[cell] != open_mark or k != key[cell]:
+                heapq.heappop(open_set)
+                continue
+
+            # no path through the open set can be cheaper than the goal's g
+            # by more than epsilon
+            if stamp[target] == epoch and cost[target] <= k:
+                return "improved", nits
+
+            # the clock is only read every few expansions
+            if nits >= max_its or (nits & 63 == 0 and time.perf_counter() > deadline):
+                return "budget", nits
+
+            heapq.heappop(open_set)
+            mark[cell] = closed_mark
+            nits += 1
+
+            g = cost[cell]
+            for delta, nb_dist in moves[nbmask[cell]]:
+                nb = cell + delta
+                if weights is not None:
+                    nb_dist *= (weights[cell] + weights[nb]) * 0.5
+
+                if stamp[nb] != epoch:
+                    stamp[nb] = epoch
+                    cost[nb] = float("inf")
+                    r, c = divmod(nb, ncols)
+                    h[nb] = heuristic(r, c, goal)
+
+                if g + nb_dist < cost[nb]:
+                    cost[nb] = g + nb_dist
+                    prev[nb] = cell
+                    if mark[nb] == closed_mark:
+                        # already expanded this round, wait for the next
+                        incons.append(nb)
+                    else:
+                        key[nb] = g + nb_dist + epsilon * h[nb]
+                        mark[nb] = open_mark
+                        heapq.heappush(open_set, (key[nb], nb))
+
+        if stamp[target] == epoch:
+            return "improved", nits
+        return "exhausted", nits
+
+    # the cells on the open set and the inconsistent ones, each once
+    def frontier(self):
+        open_mark = 2 * self.round
+        cells = {cell for k, cell in self.open if self.mark[cell] == open_mark and k == self.key[cell]}
+        cells.update(self.incons)
+        return np.fromiter(cells, dtype=np.intp, count=len(cells))
+
+    # take the path the last round found and work out its bound
+    def publish(self):
+        self.path = self.grid.getPath(self.goal, self.state, self.start)
+        self.cost = path_cost(self.grid, self.path)
+
+        # every path to the goal still goes through the frontier, so the
+        # smallest g + h there is a lower bound on the shortest path
+        cells = self.frontier()
+        if len(cells) == 0 or self.cost == 0.0:
+            self.bound = 1.0
+        else:
+            lower = float((self.state.cost[cells] + self.h[cells]).min())
+            self.bound = max(1.0, min(self.epsilon, self.cost / lower))
+        if self.bound == 1.0 or self.epsilon == 1.0:
+            self.bound = 1.0
+            self.done = True
+
+    # lower epsilon and open the frontier again with the new keys
+    def nextRound(self):
+        cells = self.frontier()
+        self.epsilon = max(1.0, self.epsilon - self.step)
+        self.round += 1
+        self.incons = []
+
+        self.key[cells] = self.state.cost[cells] + self.epsilon * self.h[cells]
+        self.mark[cells] = 2 * self.round
+        self.open = list(zip(self.key[cells].tolist(), cells.tolist()))
+        heapq.heapify(self.open)
+
+    # plan from start to goal within a budget: time_limit seconds and/or
+    # max_its expansions, no limit if neither is given. returns a Result
+    # for the best path so far with its bound, or with no path if the
+    # budget ran out before the first one. asking again for the same
+    # start and goal on the same board carries on from there
+    def plan(self, start, goal, time_limit=None, max_its=None):
+        t = time.perf_counter()
+        deadline = float("inf") if time_limit is None else t + time_limit
+        budget = float("inf") if max_its is None else max_its
+
+        if self.query != (self.grid.cell(*start), self.grid.cell(*goal), self.grid.version):
+            self.restart(start, goal)
+
+        nits = 0
+        status = None
+        while not self.done:
+            outcome, n = self.improvePath(deadline, budget - nits)
+            nits += n
+            if outcome == "budget":
+                status = "out of budget"
+                break
+            if outcome == "exhausted":
+                self.done = True
+                break
+            self.publish()
+            if not self.done:
+                self.nextRound()
+
+        if len(self.path) > 0:
+            status = "destination reached"
+        elif status is None:
+            status = "destination can't be reached"
+        else:
+            status = "couldn't reach destination within the budget"
+
+        bound = self.bound if len(self.path) > 0 else float("inf")
+        return Result(self.path, self.cost, nits, time.perf_counter() - t, status, bound=bound)
+
+
+def main():
+    start, goal, raster = random_raster(BOARD_SIZE, TREE_DENSITY, SEED)
+    grid = Grid(BOARD_SIZE, start, goal, None, obstacles=raster)
+
+    # plan with a fixed budget per tick until the path is the shortest,
+    # printing every tick the path or its bound got better
+    planner = ARAstar(grid)
+    tick = 0
+    last = None
+    while not planner.done:
+        result = planner.plan(start, goal, time_limit=TICK)
+        tick += 1
+        if (result.cost, result.bound) != last:
+            last = (result.cost, result.bound)
+            print(f"tick {tick}: {result.status}, cost {result.cost:.2f}, bound {result.bound:.3f}, "
+                  f"epsilon {planner.epsilon:.1f}")
+
+    t = time.perf_counter()
+    optimal = Astar.search_grid(grid, grid.state, start, goal, max_its=float("inf"))
+    print(f"A* from scratch: cost {grid.state.getCost(grid.cell(*goal)):.2f}, "
+          f"{optimal[1]} expansions in {time.perf_counter() - t:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
-import sys
 import math
+import time
+import heapq
 import numpy as np
 import random
 import operator
+from Grid import Grid, Result, Stats, Expansion, OFFSETS
+import Render
 
 '''
 A* Pathfinding algorithm 
@@ -14,6 +17,9 @@ HOW TO RUN THIS CODE:
     $ python3 Astar.py
 
 Created with Python 3.7.7
+
+to run on big maps, construct a Grid instead of a Board (see Grid.py).
+nothing in here prints, the console output of main() comes from Render.py
 '''
 
 # PARAMETERS
@@ -33,6 +39,7 @@ TREES = [[1, 5], [1, 6],
          [7, 3], [7, 4]]
 #############
 DO_RANDOM_BOARDS = True
+COMPACT_BOARDS = False
 
 
 class Tile:
@@ -44,6 +51,9 @@ class Tile:
         # string for storing the type, " "=EMPTY, *=TREE, $=START,#=GOAL
         self.type = _type
 
+        # cost of moving through the tile, see Grid
+        self.weight = 1.0
+
         self.visited = False
         self.current = False
         self.cost = float("inf")
@@ -56,10 +66,13 @@ class Tile:
         '''
         self.prev = []
 
+        # tiles next to this one that aren't trees, filled in by the Board
+        self.neighbors = []
+
 
 class Board:
-    def __init__(self, _size, _start, _goal, _trees):
-        print("constructing board ...")
+    def __init__(self, _size, _start, _goal, _trees, weights=None):
+        t = time.perf_counter()
         self.size = _size
         self.start = _start
         self.goal = _goal
@@ -80,20 +93,55 @@ class Board:
             self.tiles[tree[0]][tree[1]].type = "*"
             self.tiles[tree[0]][tree[1]].cost = float("inf")
 
+        # cost of moving through every tile, an (nrows, ncols) raster or
+        # None when every tile costs 1. moves cost their step cost times
+        # the average of the costs of the two tiles, like on a Grid
+        self.weights = weights
+        self.min_weight = 1.0
+        if weights is not None:
+            for row in self.tiles:
+                for tile in row:
+                    tile.weight = float(weights[tile.r][tile.c])
+                    if tile.weight == float("inf"):
+                        tile.type = "*"
+                        tile.cost = float("inf")
+
+            # the cheapest tile, see scaled
+            self.min_weight = min((tile.weight for row in self.tiles for tile in row
+                                   if tile.type != "*"), default=1.0)
+
+        # work out every tile's neighbors once, in N NE E SE S SW W NW order,
+        # leaving out moves that go off the board or into a tree
+        for row in self.tiles:
+            for tile in row:
+                for dr, dc, _ in OFFSETS:
+                    r = tile.r + dr
+                    c = tile.c + dc
+                    if 0 <= r < self.nrows and 0 <= c < self.ncols:
+                        if self.tiles[r][c].type != "*":
+                            tile.neighbors.append(self.tiles[r][c])
+
         # set start and end locations
         self.tiles[self.start[0]][self.start[1]].type = "$"
         self.tiles[self.goal[0]][self.goal[1]].type = "#"
 
         # set the start node as current and set it's distance to 0
         self.tiles[self.start[0]][self.start[1]].current = True
+        self.current = self.tiles[self.start[0]][self.start[1]]
         self.tiles[self.start[0]][self.start[1]].cost = 0
 
+        # seconds it took to build the board, for Stats
+        self.build_time = time.perf_counter() - t
+
     # return current tile object
     def getCurrentTile(self):
-        for row in self.tiles:
-            for __tile in row:
-                if __tile.current == True:
-                    return __tile
+        return self.current
+
+    # move the current tile marker to another tile
+    def setCurrentTile(self, tile):
+        self.current.current = False
+        tile.current = True
+        self.current = tile
 
     # return all unvisited tiles
     def getUnvisited(self):
@@ -104,172 +152,257 @@ class Board:
                     unv_tiles.append(tile)
         return unv_tiles
 
-    # return unvisited tiles next to current tile
-    def getNeighbors(self):
-        tile = self.getCurrentTile()
-        r = tile.r
-        c = tile.c
-        ts = self.tiles
-        maxr = self.size[0]-1
-        maxc = self.size[1]-1
-
-        if r == 0:  # no SE S SW
-            if c == 0:  # No NW W SW
-                nbs = [ts[r+1][c],  # N
-                       ts[r+1][c+1],  # NE
-                       ts[r][c+1]]  # E
-            elif c == maxc:  # no NE E SE
-                nbs = [ts[r+1][c],  # N
-                       ts[r][c-1],  # W
-                       ts[r+1][c-1]]  # NW
-            else:
-                nbs = [ts[r+1][c],  # N
-                       ts[r+1][c+1],  # NE
-                       ts[r][c+1],  # E
-                       ts[r][c-1],  # W
-                       ts[r+1][c-1]]  # NW
-        elif r == maxr:  # no N NE NW
-            if c == 0:  # No NW W SW
-                nbs = [ts[r][c+1],  # E
-                       ts[r-1][c+1],  # SE
-                       ts[r-1][c]]  # S
-            elif c == maxc:  # no NE E SE
-                nbs = [ts[r-1][c],  # S
-                       ts[r-1][c-1],  # SW
-                       ts[r][c-1]]  # W
-            else:
-                nbs = [ts[r][c+1],  # E
-                       ts[r-1][c+1],  # SE
-                       ts[r-1][c],  # S
-                       ts[r-1][c-1],  # SW
-                       ts[r][c-1]]  # W
-        elif c == 0:  # no NW W SW
-            nbs = [ts[r+1][c],  # N
-                   ts[r+1][c+1],  # NE
-                   ts[r][c+1],  # E
-                   ts[r-1][c+1],  # SE
-                   ts[r-1][c]]  # S
-        elif c == maxc:  # no NE E SE
-            nbs = [ts[r+1][c],  # N
-                   ts[r-1][c],  # S
-                   ts[r-1][c-1],  # SW
-                   ts[r][c-1],  # W
-                   ts[r+1][c-1]]  # NW
-        else:
-            nbs = [ts[r+1][c],  # N
-                   ts[r+1][c+1],  # NE
-                   ts[r][c+1],  # E
-                   ts[r-1][c+1],  # SE
-                   ts[r-1][c],  # S
-                   ts[r-1][c-1],  # SW
-                   ts[r][c-1],  # W
-                   ts[r+1][c-1]]  # NW
-
-        return nbs
-
-    # show the board to the user, and optionally the path
-    def print_board(self, _path):
-        # top line
-        sys.stdout.write("\n   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-        for row in self.tiles[::-1]:
-            # row legend
-            if row[0].r < 10:
-                sys.stdout.write(" ")
-            sys.stdout.write(str(row[0].r)+" ")
-
-            # board content
-            for tile in row:
-                if [tile.r, tile.c] in _path:
-                    sys.stdout.write("|@")
-                else:
-                    sys.stdout.write("|"+tile.type)
-
-            sys.stdout.write("|\n")
-        # bottom line
-        sys.stdout.write("   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-        # column legend
-        sys.stdout.write("    ")
-        for num in range(self.ncols):
-            sys.stdout.write(str(num)+" ")
-        print()
-
-    def print_distances(self):
-        # top line
-        sys.stdout.write("\n   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-
-        for row in self.tiles[::-1]:
-            # row legend
-            if row[0].r < 10:
-                sys.stdout.write(" ")
-            sys.stdout.write(str(row[0].r)+" ")
-
-            # board content
-            for tile in row:
-                if tile.cost == float("inf"):
-                    sys.stdout.write(f"|  {tile.cost}")
-                else:
-                    sys.stdout.write("|%5.1f" % tile.cost)
-            sys.stdout.write("|\n")
-
-        # bottom line
-        sys.stdout.write("   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-
-        # column legend
-        sys.stdout.write("    ")
-        for num in range(self.ncols):
-            sys.stdout.write(str(num)+" ")
-        print()
+    # return the tiles next to a tile (the current tile by default) that aren't trees
+    def getNeighbors(self, tile=None):
+        if tile is None:
+            tile = self.current
+
+        return list(tile.neighbors)
+
+
+# admissible heuristics for the 8-connected moves in Board.getNeighbors,
+# each one gives a lower bound on the cost from [r, c] to the goal
+def octile(r, c, goal):
+    dr = abs(goal[0] - r)
+    dc = abs(goal[1] - c)
+    # take as many diagonal steps as we can, then go straight
+    return max(dr, dc) + (math.sqrt(2.0) - 1.0) * min(dr, dc)
+
+
+def euclidean(r, c, goal):
+    return math.sqrt((goal[0] - r)**2 + (goal[1] - c)**2)
+
+
+def zero(r, c, goal):
+    # turns A* into Dijkstra's algorithm
+    return 0.0
+
+
+# a heuristic for a weighted board, where every move costs at least
+# factor (the cost of the cheapest cell) times its step cost. heuristics
+# that already know the cell costs (see Heuristics.py) set weighted=True
+def scaled(heuristic, factor):
+    if factor == 1.0 or heuristic is zero or getattr(heuristic, "weighted", False):
+        return heuristic
+
+    def weighted(r, c, goal):
+        return factor * heuristic(r, c, goal)
+    return weighted
+
+
+# A* from start to goal on a Grid, writing g-costs and prev links into a
+# freshly reset SearchState. doesn't print anything. returns whether the
+# goal was reached within max_its expansions (MAX_ITS by default) and how
+# many cells were expanded. pass a Stats to have its counters filled in
+def search_grid(grid, state, start, goal, heuristic=octile, max_its=None, stats=None):
+    if max_its is None:
+        max_its = MAX_ITS
+
+    epoch = state.epoch
+    cost = memoryview(state.cost)
+    prev = memoryview(state.prev)
+    stamp = memoryview(state.stamp)
+    closed = memoryview(state.closed)
+    ncols = grid.ncols
+    moves = grid.moves
+    nbmask = memoryview(grid.nbmask)
+    weights = grid._weights
+    heuristic = scaled(heuristic, grid.min_weight)
+    nits = 0
+    nstale = 0
+    found = False
+
+    # open set of (f, h, cell), cost holds g and closed is the closed set
+    source = grid.cell(*start)
+    target = grid.cell(*goal)
+    cost[source] = 0.0
+    prev[source] = -1
+    stamp[source] = epoch
+    h = heuristic(start[0], start[1], goal)
+    open_set = [(h, h, source)]
+
+    while open_set:
+        _, _, cell = heapq.heappop(open_set)
+        if closed[cell] == epoch:
+            nstale += 1
+            continue
+
+        # stop if we've reached the destination
+        if cell == target:
+            found = True
+            break
+
+        g = cost[cell]
+        for delta, nb_dist in moves[nbmask[cell]]:
+            nb = cell + delta
+            if closed[nb] == epoch:
+                continue
+            if weights is not None:
+                nb_dist *= (weights[cell] + weights[nb]) * 0.5
+
+            # only keep the cheapest way we have found to get there
+            if stamp[nb] != epoch or g + nb_dist < cost[nb]:
+                cost[nb] = g + nb_dist
+                stamp[nb] = epoch
+
+                # keep track of shortest path
+                prev[nb] = cell
+
+                r, c = divmod(nb, ncols)
+                h = heuristic(r, c, goal)
+                heapq.heappush(open_set, (g + nb_dist + h, h, nb))
+
+        closed[cell] = epoch
+
+        nits += 1
+        if nits > max_its:
+            break
+
+    if stats is not None:
+        stats.countSearch(grid, state, nits, nstale, found, len(open_set))
+
+    return found, nits
+
+
+# the same search as search_grid, one step at a time: a generator that
+# yields an Expansion after every cell it expands, so the caller can stop
+# whenever it likes (a time budget, a UI frame) and the SearchState holds
+# everything found so far. returns (found, nits) like search_grid when it
+# runs out, which "yield from" hands back
+def search_iter(grid, state, start, goal, heuristic=octile, max_its=None):
+    if max_its is None:
+        max_its = MAX_ITS
+
+    epoch = state.epoch
+    cost = memoryview(state.cost)
+    prev = memoryview(state.prev)
+    stamp = memoryview(state.stamp)
+    closed = memoryview(state.closed)
+    ncols = grid.ncols
+    moves = grid.moves
+    nbmask = memoryview(grid.nbmask)
+    weights = grid._weights
+    heuristic = scaled(heuristic, grid.min_weight)
+    nits = 0
+
+    source = grid.cell(*start)
+    target = grid.cell(*goal)
+    cost[source] = 0.0
+    prev[source] = -1
+    stamp[source] = epoch
+    h = heuristic(start[0], start[1], goal)
+    open_set = [(h, h, source)]
+
+    while open_set:
+        _, cell_h, cell = heapq.heappop(open_set)
+        if closed[cell] == epoch:
+            continue
+        if cell == target:
+            return True, nits
+
+        g = cost[cell]
+        for delta, nb_dist in moves[nbmask[cell]]:
+            nb = cell + delta
+            if closed[nb] == epoch:
+                continue
+            if weights is not None:
+                nb_dist *= (weights[cell] + weights[nb]) * 0.5
+
+            if stamp[nb] != epoch or g + nb_dist < cost[nb]:
+                cost[nb] = g + nb_dist
+                stamp[nb] = epoch
+                prev[nb] = cell
+
+                r, c = divmod(nb, ncols)
+                h = heuristic(r, c, goal)
+                heapq.heappush(open_set, (g + nb_dist + h, h, nb))
+
+        closed[cell] = epoch
+
+        nits += 1
+        r, c = divmod(cell, ncols)
+        yield Expansion(cell, r, c, g, cell_h, nits, len(open_set))
+        if nits > max_its:
+            break
+
+    return False, nits
 
 
 class Astar:
-    def __init__(self, _board):
-        print("getting ready for Astar algorithm . . .")
-
+    def __init__(self, _board, heuristic=octile):
         self.nits = 0
+        self.found = False
 
-        # shallow copy the board
-        self.board = _board
-
-        # show the starting board
-        self.board.print_board([])
-
-        # run Djkstras algorithm
-        self.iterate()
+        # why the search stopped
+        self.status = None
 
-        # print results
-        if self.nits < MAX_ITS:
+        # function of (r, c, goal) that never overestimates the remaining cost
+        self.heuristic = heuristic
 
-            path = self.recover_path()
+        # shallow copy the board
+        self.board = _board
 
-            self.print_text_path(path)
+    # run the A* algorithm and return a Result. on a Board,
+    # on_iteration(board, tile, costs, next_tile, f) is called after every
+    # expansion, see Render.show_astar_iteration. with stats=True the
+    # Result carries the Stats of the search
+    def run(self, on_iteration=None, stats=False):
+        stats = Stats("astar") if stats else None
 
-            self.board.print_board(path)
+        t = time.perf_counter()
+        if isinstance(self.board, Grid):
+            self.iterate_grid(stats)
+        else:
+            self.iterate(on_iteration, stats)
+        t_search = time.perf_counter()
+
+        path = self.recover_path()
+        if not self.found:
+            cost = float("inf")
+        elif isinstance(self.board, Grid):
+            cost = self.board.state.getCost(self.board.cell(*self.board.goal))
+        else:
+            cost = self.board.tiles[self.board.goal[0]][self.board.goal[1]].cost
+        t_end = time.perf_counter()
+
+        if stats is not None:
+            stats.phases["construction"] = self.board.build_time
+            stats.phases["search"] = t_search - t
+            stats.phases["recover_path"] = t_end - t_search
+            stats.export()
+
+        return Result(path, cost, self.nits, t_end - t, self.status, stats)
+
+    def iterate(self, on_iteration=None, stats=None):
+        goal = self.board.goal
+        heuristic = scaled(self.heuristic, self.board.min_weight)
+
+        # counters for Stats, cheap next to the rest of the loop
+        npushes = 1
+        npops = 0
+        nevaluations = 0
+        nreopens = 0
+        nexpanded = 0
+
+        # the open set is a priority queue of (f, h, row, col) where
+        # f = g + h, tile.cost holds g and tile.heuristic holds h. ties on f
+        # go to the tile closer to the goal. tile.visited is the closed set,
+        # entries for tiles closed after being pushed are skipped when popped
+        tile = self.board.getCurrentTile()
+        tile.heuristic = heuristic(tile.r, tile.c, goal)
+        self.open = [(tile.cost + tile.heuristic, tile.heuristic, tile.r, tile.c)]
 
-    def iterate(self):
-        print("iterating . . .")
         while True:
-            tile = self.board.getCurrentTile()
-
             # stop if we've reached the destination
-            if tile.r == self.board.goal[0] and tile.c == self.board.goal[1]:
-                print("stopping: destination reached")
+            if tile.r == goal[0] and tile.c == goal[1]:
+                self.found = True
+                self.status = "destination reached"
                 break
 
             costs = []
 
-            nbs = self.board.getNeighbors()
+            nbs = self.board.getNeighbors(tile)
+            nevaluations += len(nbs)
             for nb in nbs:
                 if nb.type == " " or nb.type == "#":
                     if nb.visited == False:
@@ -279,75 +412,94 @@ class Astar:
                         else:
                             # neighbor is diagonal: distance is hypotenouse of 45-45-90 triangle
                             nb_dist = math.sqrt(2.0)
+                        nb_dist *= (tile.weight + nb.weight) * 0.5
 
-                        # ADDITION FOR A* ########################################################
-                        nb.heuristic = np.sqrt((self.board.goal[0] - nb.r)**2 + (self.board.goal[1] - nb.c)**2)
-                        # alternatively
-                        # heuristic = (self.board.goal[0] - nb.r) + (self.board.goal[1] - nb.c)
-
-                        nb.cost = tile.cost + nb_dist + nb.heuristic
+                        # only keep the cheapest way we have found to get there
+                        if tile.cost + nb_dist < nb.cost:
+                            if nb.cost < float("inf"):
+                                nreopens += 1
+                            nb.cost = tile.cost + nb_dist
+                            nb.heuristic = heuristic(nb.r, nb.c, goal)
 
-                        costs.append((nb.cost, nb))
+                            costs.append((nb.cost + nb.heuristic, nb))
 
-                        # keep track of shortest path
-                        nb.prev = [tile.r, tile.c]
+                            heapq.heappush(self.open, (nb.cost + nb.heuristic, nb.heuristic, nb.r, nb.c))
+                            npushes += 1
 
-            sorted_costs = sorted(costs, key=lambda x: x[0])
+                            # keep track of shortest path
+                            nb.prev = [tile.r, tile.c]
 
-            next_tile = sorted_costs[0][1]
-
-            next_tile.current = True
-            tile.current = False
             tile.visited = True
+            nexpanded += 1
+
+            # select the open tile with the lowest f
+            next_tile = None
+            while self.open:
+                f, _, r, c = heapq.heappop(self.open)
+                npops += 1
+                if not self.board.tiles[r][c].visited:
+                    next_tile = self.board.tiles[r][c]
+                    break
+
+            if next_tile is None:
+                self.status = "destination can't be reached"
+                break
 
-            if SHOW_ITERATIONS:
-                print("\ncurrent node: [{}, {}]".format(tile.r, tile.c))
-                sys.stdout.write("neighbors: ")
-                for tup in sorted_costs:
-                    sys.stdout.write(f"{[tup[1].r,tup[1].c]} ")
-                sys.stdout.write("\nwith costs: ")
-                for tup in sorted_costs:
-                    sys.stdout.write(f"{tup[0]:.4f} ")
-                sys.stdout.write("\n")
-                print(f"minimum cost: {sorted_costs[0][0]:.4f}")
-                print("selecting node: [{}, {}]".format(next_tile.r, next_tile.c))
-                self.board.print_distances()
+            self.board.setCurrentTile(next_tile)
+
+            if on_iteration is not None:
+                on_iteration(self.board, tile, costs, next_tile, f)
 
             self.nits += 1
             if self.nits > MAX_ITS:
-                print("stopping: couldn't reach destination in {} iterations".format(MAX_ITS))
+                self.status = "couldn't reach destination in {} iterations".format(MAX_ITS)
                 break
 
+            # carry the current tile instead of searching the board for it
+            tile = next_tile
+
+        if stats is not None:
+            stats.expanded = nexpanded
+            stats.pushes = npushes
+            stats.pops = npops
+            stats.evaluations = nevaluations
+            stats.reopens = nreopens
+
+    # same search as iterate, on the arrays of a Grid
+    def iterate_grid(self, stats=None):
+        grid = self.board
+        grid.state.reset()
+        self.found, self.nits = search_grid(grid, grid.state, grid.start, grid.goal,
+                                            self.heuristic, stats=stats)
+
+        if self.found:
+            self.status = "destination reached"
+        elif self.nits > MAX_ITS:
+            self.status = "couldn't reach destination in {} iterations".format(MAX_ITS)
+        else:
+            self.status = "destination can't be reached"
+
+    # walk back from a location to the start along the prev links,
+    # yielding [r, c] of every tile on the way
+    def walk_back(self, location):
+        tile = self.board.tiles[location[0]][location[1]]
+        yield [tile.r, tile.c]
+        while tile.prev != []:
+            tile = self.board.tiles[tile.prev[0]][tile.prev[1]]
+            yield [tile.r, tile.c]
+
+    # return the path from the start to the goal as an (L, 2) array of
+    # [r, c] rows, or an empty array if the goal wasn't reached
     def recover_path(self):
+        if isinstance(self.board, Grid):
+            return self.board.getPath()
 
-        #  start at the destination
-        location = self.board.goal
-
-        thepath = [location]
-
-        # # walk back along the shortest path
-        while location != self.board.start:
-            # get the tile object at that location
-            for row in self.board.tiles:
-                for tile in row:
-                    if [tile.r, tile.c] == location:
-                        thetile = tile
-
-            location = thetile.prev
-            thepath.append(location)
+        thepath = list(self.walk_back(self.board.goal))
+        if thepath[-1] != self.board.start:
+            return np.empty((0, 2), dtype=np.intp)
 
         # reverse the path
-        for node in thepath:
-            node = node[::-1]
-
-        return thepath[::-1]
-
-    def print_text_path(self, __path):
-        print("\nshortest path:")
-        for _loc in __path:
-            sys.stdout.write(str(_loc))
-            if __path.index(_loc) != len(__path)-1:
-                 sys.stdout.write("->")
+        return np.array(thepath[::-1], dtype=np.intp)
 
 
 def locate_min(a):
@@ -357,11 +509,17 @@ def locate_min(a):
 
 
 def main():
+    # pick the kind of board to build
+    board_type = Grid if COMPACT_BOARDS else Board
+
     # instantiate a board object
-    b = Board(BOARD_SIZE, START, GOAL, TREES)
+    b = board_type(BOARD_SIZE, START, GOAL, TREES)
+
+    # only show every step when asked to
+    on_iteration = Render.show_astar_iteration if SHOW_ITERATIONS else None
 
     # run Astar's algorithm on that board
-    Astar(b)
+    Render.show("Astar", b, Astar(b), on_iteration)
 
     # easter egg?
     if DO_RANDOM_BOARDS:
@@ -379,7 +537,8 @@ def main():
             if start2 in random_trees: random_trees.remove(start2)
             if goal2 in random_trees: random_trees.remove(goal2)
 
-            Astar(Board(size2,start2,goal2,random_trees))
+            b2 = board_type(size2,start2,goal2,random_trees)
+            Render.show("Astar", b2, Astar(b2), on_iteration)
 
 
 if __name__ == "__main__":
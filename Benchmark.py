@@ -0,0 +1,246 @@
+import sys
+import csv
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+from Grid import Grid, random_board, random_raster
+from Planner import Planner, ALGORITHMS
+import Astar
+
+'''
+Benchmarks for the planners
+
+The suite plans corner to corner on seeded random boards of every size
+and tree density asked for, with every planner, and reports one row per
+run: wall time, expansions, peak memory and how far the path cost is
+from the optimal (Dijkstra's) cost. The same seed always gives the same
+boards, so two tables can be compared row by row to catch regressions.
+
+HOW TO RUN THIS CODE:
+
+    $ python Benchmark.py                   # neighbor generation
+    $ python Benchmark.py suite             # full suite as CSV on stdout
+    $ python Benchmark.py suite --sizes 11 256 --densities 0 0.3 --out results.json
+
+the output format follows the extension of --out, .csv or .json
+'''
+
+# PARAMETERS
+#############
+SEED = 0
+NEIGHBOR_BOARD_SIZE = [300, 300]
+TREE_DENSITY = 0.2
+FRONTIER_SIZE = 1000
+#############
+SUITE_SIZES = [11, 64, 256, 1024, 4096]  # square boards
+SUITE_DENSITIES = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+SUITE_REPEAT = 1  # timed runs per row, the fastest one is reported
+#############
+FIELDS = ["nrows", "ncols", "density", "seed", "algorithm", "found", "cost",
+          "expansions", "time", "peak_bytes", "gap"]
+
+
+# time fn over every item and return the microseconds per item
+def per_item(fn, items):
+    t = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - t) / len(items) * 1e6
+
+
+# the if/elif chain Board.getNeighbors used before the offset tables,
+# kept here to compare against. returns every tile next to a tile,
+# trees too
+def chain_neighbors(board, tile):
+    r = tile.r
+    c = tile.c
+    ts = board.tiles
+    maxr = board.size[0]-1
+    maxc = board.size[1]-1
+
+    if r == 0:  # no SE S SW
+        if c == 0:  # No NW W SW
+            nbs = [ts[r+1][c],  # N
+                   ts[r+1][c+1],  # NE
+                   ts[r][c+1]]  # E
+        elif c == maxc:  # no NE E SE
+            nbs = [ts[r+1][c],  # N
+                   ts[r][c-1],  # W
+                   ts[r+1][c-1]]  # NW
+        else:
+            nbs = [ts[r+1][c],  # N
+                   ts[r+1][c+1],  # NE
+                   ts[r][c+1],  # E
+                   ts[r][c-1],  # W
+                   ts[r+1][c-1]]  # NW
+    elif r == maxr:  # no N NE NW
+        if c == 0:  # No NW W SW
+            nbs = [ts[r][c+1],  # E
+                   ts[r-1][c+1],  # SE
+                   ts[r-1][c]]  # S
+        elif c == maxc:  # no NE E SE
+            nbs = [ts[r-1][c],  # S
+                   ts[r-1][c-1],  # SW
+                   ts[r][c-1]]  # W
+        else:
+            nbs = [ts[r][c+1],  # E
+                   ts[r-1][c+1],  # SE
+                   ts[r-1][c],  # S
+                   ts[r-1][c-1],  # SW
+                   ts[r][c-1]]  # W
+    elif c == 0:  # no NW W SW
+        nbs = [ts[r+1][c],  # N
+               ts[r+1][c+1],  # NE
+               ts[r][c+1],  # E
+               ts[r-1][c+1],  # SE
+               ts[r-1][c]]  # S
+    elif c == maxc:  # no NE E SE
+        nbs = [ts[r+1][c],  # N
+               ts[r-1][c],  # S
+               ts[r-1][c-1],  # SW
+               ts[r][c-1],  # W
+               ts[r+1][c-1]]  # NW
+    else:
+        nbs = [ts[r+1][c],  # N
+               ts[r+1][c+1],  # NE
+               ts[r][c+1],  # E
+               ts[r-1][c+1],  # SE
+               ts[r-1][c],  # S
+               ts[r-1][c-1],  # SW
+               ts[r][c-1],  # W
+               ts[r+1][c-1]]  # NW
+
+    return nbs
+
+
+# neighbor generation is the innermost loop of both planners
+def bench_neighbors(size, density, seed):
+    start, goal, trees = random_board(size, density, seed)
+    board = Astar.Board(size, start, goal, trees)
+    grid = Grid(size, start, goal, trees)
+
+    tiles = [tile for row in board.tiles for tile in row]
+    cells = np.arange(grid.ncells)
+    frontiers = np.array_split(cells, max(1, grid.ncells // FRONTIER_SIZE))
+
+    results = {}
+    results["if/elif chain"] = per_item(lambda tile: chain_neighbors(board, tile), tiles)
+    results["Board.getNeighbors"] = per_item(board.getNeighbors, tiles)
+    results["Grid.getNeighbors"] = per_item(grid.getNeighbors, cells.tolist())
+    results["Grid.expand"] = per_item(grid.expand, frontiers) * len(frontiers) / grid.ncells
+    return results
+
+
+# plan corner to corner on one board with every algorithm. returns a row
+# (a dict with FIELDS as keys) per algorithm. peak_bytes is measured in a
+# separate run because tracing allocations slows the search down a lot
+def bench_board(size, density, seed, algorithms=ALGORITHMS, repeat=SUITE_REPEAT, memory=True):
+    start, goal, raster = random_raster(size, density, seed)
+    grid = Grid(size, start, goal, None, obstacles=raster)
+
+    rows = []
+    results = {}
+    for algorithm in algorithms:
+        # no expansion limit, the big boards need millions
+        planner = Planner(grid, algorithm, max_its=float("inf"))
+        result = min((planner.plan(start, goal) for _ in range(repeat)), key=lambda r: r.time)
+        results[algorithm] = result
+
+        peak_bytes = None
+        if memory:
+            del planner
+            tracemalloc.start()
+            Planner(grid, algorithm, max_its=float("inf")).plan(start, goal)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        rows.append({"nrows": size[0], "ncols": size[1], "density": density, "seed": seed,
+                     "algorithm": algorithm, "found": result.found,
+                     "cost": result.cost if result.found else None,
+                     "expansions": result.expansions, "time": result.time,
+                     "peak_bytes": peak_bytes, "gap": None})
+
+    # Dijkstra's cost is the optimal one
+    if "dijkstra" in results:
+        optimal = results["dijkstra"].cost
+    else:
+        optimal = Planner(grid, "dijkstra", max_its=float("inf")).plan(start, goal).cost
+
+    for row in rows:
+        if row["found"] and optimal < float("inf"):
+            row["gap"] = row["cost"] / optimal - 1.0 if optimal > 0 else 0.0
+
+    return rows
+
+
+# run bench_board on a square board of every size at every density.
+# every board gets its own seed, worked out from the suite's seed, its
+# size and its density, so a row doesn't change when others are added
+def run_suite(sizes=SUITE_SIZES, densities=SUITE_DENSITIES, seed=SEED,
+              algorithms=ALGORITHMS, repeat=SUITE_REPEAT, memory=True, on_row=None):
+    rows = []
+    for n in sizes:
+        for density in densities:
+            board_seed = np.random.SeedSequence([seed, n, n, int(round(density * 1e6))]).generate_state(1)[0]
+            for row in bench_board([n, n], density, int(board_seed), algorithms, repeat, memory):
+                rows.append(row)
+                if on_row is not None:
+                    on_row(row)
+    return rows
+
+
+def write_csv(rows, f):
+    writer = csv.DictWriter(f, FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def write_json(rows, f):
+    json.dump(rows, f, indent=1)
+    f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks for the planners")
+    parser.add_argument("bench", nargs="?", choices=["neighbors", "suite"], default="neighbors")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES)
+    parser.add_argument("--densities", type=float, nargs="+", default=SUITE_DENSITIES)
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=list(ALGORITHMS))
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--repeat", type=int, default=SUITE_REPEAT)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the peak memory runs")
+    parser.add_argument("--out", help="write the table to a .csv or .json file")
+    args = parser.parse_args()
+
+    if args.bench == "neighbors":
+        print(f"neighbor generation on a {NEIGHBOR_BOARD_SIZE[0]}x{NEIGHBOR_BOARD_SIZE[1]} board, "
+              f"tree density {TREE_DENSITY}")
+        results = bench_neighbors(NEIGHBOR_BOARD_SIZE, TREE_DENSITY, SEED)
+        for name, us in results.items():
+            sys.stdout.write(f"{name:>20}: {us:6.3f} us per cell\n")
+        return
+
+    # progress goes to stderr so the table can be piped
+    def on_row(row):
+        sys.stderr.write(f"{row['nrows']}x{row['ncols']} density {row['density']} "
+                         f"{row['algorithm']}: {row['time']:.4f} s, {row['expansions']} expansions\n")
+
+    rows = run_suite(args.sizes, args.densities, args.seed, args.algorithms,
+                     args.repeat, args.memory, on_row)
+
+    if args.out is None:
+        write_csv(rows, sys.stdout)
+    else:
+        with open(args.out, "w", newline="") as f:
+            if args.out.endswith(".json"):
+                write_json(rows, f)
+            else:
+                write_csv(rows, f)
+
+
+if __name__ == "__main__":
+    main()
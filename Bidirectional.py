@@ -0,0 +1,240 @@
+import time
+import heapq
+import numpy as np
+
+from Grid import Grid, SearchState, Result, Stats
+import Astar
+import Render
+
+'''
+Bidirectional Dijkstra / A*
+
+Searches forward from the start and backward from the goal at the same
+time, always growing the smaller of the two frontiers. A frontier grows
+with its radius, so on long queries like corner to corner two searches
+that meet halfway cover about half the area one search does.
+
+Moves cost the same both ways on a Board, so the backward search uses
+the same neighbors as the forward one. Both searches share the potential
+
+    p(v) = (h(v, goal) - h(v, start)) / 2
+
+(forward keys are g + p, backward keys are g - p), which keeps the keys
+of both sides consistent with each other. A path through a cell seen by
+both searches can't beat the best one found so far once the two
+smallest keys add up to its cost, and that's when the search stops.
+With the zero heuristic this is plain bidirectional Dijkstra.
+
+    >>> from Bidirectional import Bidirectional
+    >>> result = Bidirectional(Grid([100, 100], [0, 0], [99, 99], trees)).run()
+
+or from a Planner with algorithm="biastar" or "bidijkstra". the search
+runs on a Grid, a Board is converted first
+
+HOW TO RUN THIS CODE:
+
+    $ python Bidirectional.py
+'''
+
+# PARAMETERS
+#############
+MAX_ITS = 1e4  # cells expanded by both searches together before giving up
+#############
+
+
+# bidirectional search between start and goal on a Grid. fwd and bwd are
+# freshly reset SearchStates for the forward and backward searches. once
+# the searches meet, the backward half of the path is spliced into fwd,
+# so fwd ends up holding the whole path and its cost like after a
+# search_grid of Astar.py. returns whether the goal was reached within
+# max_its expansions (MAX_ITS by default) and how many cells were
+# expanded. pass a Stats to have its counters filled in
+def search_grid(grid, fwd, bwd, start, goal, heuristic=Astar.octile, max_its=None, stats=None):
+    if max_its is None:
+        max_its = MAX_ITS
+
+    ncols = grid.ncols
+    moves = grid.moves
+    nbmask = memoryview(grid.nbmask)
+    weights = grid._weights
+    heuristic = Astar.scaled(heuristic, grid.min_weight)
+    source = grid.cell(*start)
+    target = grid.cell(*goal)
+
+    # (epoch, cost, prev, stamp, closed) of each side, and the sign its
+    # keys take the potential with
+    sides = []
+    for state, sign in ((fwd, 1.0), (bwd, -1.0)):
+        sides.append((state.epoch, memoryview(state.cost), memoryview(state.prev),
+                      memoryview(state.stamp), memoryview(state.closed), sign))
+
+    def potential(cell):
+        r, c = divmod(cell, ncols)
+        return (heuristic(r, c, goal) - heuristic(r, c, start)) / 2.0
+
+    # bidirectional Dijkstra doesn't need to work out potentials of 0
+    if heuristic is Astar.zero:
+        def potential(cell):
+            return 0.0
+
+    opens = []
+    for (epoch, cost, prev, stamp, _, sign), root in zip(sides, (source, target)):
+        cost[root] = 0.0
+        prev[root] = -1
+        stamp[root] = epoch
+        opens.append([(sign * potential(root), root)])
+
+    # cost of the best path found so far and the cell the searches met in
+    best = float("inf")
+    meet = -1
+    if source == target:
+        best = 0.0
+        meet = source
+
+    nits = [0, 0]
+    nstale = [0, 0]
+    while opens[0] and opens[1]:
+        # stop when no path through the frontiers can be cheaper than the
+        # best one. a stale entry on top only has a smaller key than the
+        # real top, so this never stops too early
+        if opens[0][0][0] + opens[1][0][0] >= best:
+            break
+
+        # grow the smaller frontier
+        side = 0 if len(opens[0]) <= len(opens[1]) else 1
+        epoch, cost, prev, stamp, closed, sign = sides[side]
+        other_epoch, other_cost, _, other_stamp, _, _ = sides[1 - side]
+        open_set = opens[side]
+
+        _, cell = heapq.heappop(open_set)
+        if closed[cell] == epoch:
+            nstale[side] += 1
+            continue
+
+        g = cost[cell]
+        for delta, nb_dist in moves[nbmask[cell]]:
+            nb = cell + delta
+            if closed[nb] == epoch:
+                continue
+            if weights is not None:
+                nb_dist *= (weights[cell] + weights[nb]) * 0.5
+
+            # only keep the cheapest way we have found to get there
+            if stamp[nb] != epoch or g + nb_dist < cost[nb]:
+                cost[nb] = g + nb_dist
+                stamp[nb] = epoch
+
+                # keep track of shortest path
+                prev[nb] = cell
+
+                heapq.heappush(open_set, (g + nb_dist + sign * potential(nb), nb))
+
+                # a path through nb if the other side has been there
+                if other_stamp[nb] == other_epoch and g + nb_dist + other_cost[nb] < best:
+                    best = g + nb_dist + other_cost[nb]
+                    meet = nb
+
+        closed[cell] = epoch
+
+        nits[side] += 1
+        if nits[0] + nits[1] > max_its:
+            # best isn't known to be the shortest yet
+            meet = -1
+            break
+
+    # count before the backward half is spliced in, the cells it stamps
+    # in fwd weren't discovered by the forward search
+    if stats is not None:
+        backward = Stats()
+        stats.countSearch(grid, fwd, nits[0], nstale[0], False, len(opens[0]))
+        backward.countSearch(grid, bwd, nits[1], nstale[1], False, len(opens[1]))
+        stats.add(backward)
+
+    found = meet != -1
+    if found:
+        # splice the backward half, from meet to the goal, into fwd
+        epoch, cost, prev, stamp, _, _ = sides[0]
+        _, bwd_cost, bwd_prev, _, _, _ = sides[1]
+        cell = meet
+        while bwd_prev[cell] != -1:
+            nxt = bwd_prev[cell]
+            cost[nxt] = best - bwd_cost[nxt]
+            prev[nxt] = cell
+            stamp[nxt] = epoch
+            cell = nxt
+
+    return found, nits[0] + nits[1]
+
+
+class Bidirectional:
+    def __init__(self, _board, heuristic=Astar.octile):
+        self.nits = 0
+        self.found = False
+
+        # why the search stopped
+        self.status = None
+
+        # function of (r, c, goal) that never overestimates the remaining
+        # cost, Astar.zero for bidirectional Dijkstra
+        self.heuristic = heuristic
+
+        # shallow copy the board, and make a Grid to search on if need be
+        self.board = _board
+        self.grid = Grid.from_board(_board)
+
+        # state of the backward search, the forward one uses the Grid's
+        self.back = SearchState(self.grid.ncells)
+
+    # run the bidirectional search and return a Result. on_iteration isn't
+    # used, there is no step by step view of two searches. with stats=True
+    # the Result carries the Stats of the search
+    def run(self, on_iteration=None, stats=False):
+        stats = Stats("bidirectional") if stats else None
+        grid = self.grid
+
+        t = time.perf_counter()
+        grid.state.reset()
+        self.back.reset()
+        self.found, self.nits = search_grid(grid, grid.state, self.back, grid.start, grid.goal,
+                                            self.heuristic, stats=stats)
+        if self.found:
+            self.status = "destination reached"
+        elif self.nits > MAX_ITS:
+            self.status = "couldn't reach destination in {} iterations".format(MAX_ITS)
+        else:
+            self.status = "destination can't be reached"
+        t_search = time.perf_counter()
+
+        path = self.recover_path()
+        if self.found:
+            cost = grid.state.getCost(grid.cell(*grid.goal))
+        else:
+            cost = float("inf")
+        t_end = time.perf_counter()
+
+        if stats is not None:
+            stats.phases["construction"] = self.board.build_time
+            stats.phases["search"] = t_search - t
+            stats.phases["recover_path"] = t_end - t_search
+            stats.export()
+
+        return Result(path, cost, self.nits, t_end - t, self.status, stats)
+
+    # return the path from the start to the goal as an (L, 2) array of
+    # [r, c] rows, or an empty array if the goal wasn't reached
+    def recover_path(self):
+        if not self.found:
+            return np.empty((0, 2), dtype=np.intp)
+        return self.grid.getPath()
+
+
+def main():
+    # the same board as Astar.py
+    b = Astar.Board(Astar.BOARD_SIZE, Astar.START, Astar.GOAL, Astar.TREES)
+
+    # run bidirectional A* on that board
+    Render.show("bidirectional Astar", b, Bidirectional(b))
+
+
+if __name__ == "__main__":
+    main()
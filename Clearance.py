@@ -0,0 +1,93 @@
+import math
+import time
+import numpy as np
+
+from Grid import Grid, random_raster
+from Planner import Planner
+
+'''
+Clearance map and robot radius
+
+A robot with a footprint can't go everywhere a point can: it has to stay
+its radius away from every tree. Instead of inflating the list of trees
+by hand and building a new board for every robot, the board works out
+once how far every cell is from the nearest tree (an exact Euclidean
+distance transform, Grid.distance_to_trees) and keeps it until its trees
+change. A robot of any radius then gets the board with every cell closer
+than its radius to a tree blocked, which is one comparison against that
+raster:
+
+    >>> clearance = grid.clearance()
+    >>> planner = Planner(grid, radius=2.0)
+    >>> planner.plan([0, 0], [99, 99])
+    >>> planner.plan([0, 0], [99, 99], radius=3.5)
+
+main() plans for a few radii both ways, by hand and from the clearance
+raster, and checks they agree.
+
+HOW TO RUN THIS CODE:
+
+    $ python Clearance.py
+'''
+
+# PARAMETERS
+#############
+BOARD_SIZE = [512, 512]
+TREE_DENSITY = 0.02
+SEED = 0
+RADII = [1.0, 1.5, 2.0, 3.0, 4.5]
+NQUERIES = 20
+#############
+
+
+# the old way: a list of TREES with every cell closer than radius to a
+# tree added, for a new board
+def inflate_by_hand(size, trees, radius):
+    reach = int(math.ceil(radius))
+    disc = [(dr, dc) for dr in range(-reach, reach + 1) for dc in range(-reach, reach + 1)
+            if dr * dr + dc * dc < radius * radius]
+    inflated = set()
+    for r, c in trees:
+        for dr, dc in disc:
+            if 0 <= r + dr < size[0] and 0 <= c + dc < size[1]:
+                inflated.add((r + dr, c + dc))
+    return [list(location) for location in inflated]
+
+
+def main():
+    start, goal, raster = random_raster(BOARD_SIZE, TREE_DENSITY, SEED)
+    grid = Grid(BOARD_SIZE, start, goal, None, obstacles=raster)
+
+    rng = np.random.default_rng(SEED)
+    free = np.argwhere(raster == 0).tolist()
+    trees = np.argwhere(raster != 0).tolist()
+    queries = [(free[i], free[j]) for i, j in rng.integers(0, len(free), (NQUERIES, 2))]
+
+    # a new board for every radius, inflated by hand
+    t = time.perf_counter()
+    boards = [Grid(BOARD_SIZE, start, goal, inflate_by_hand(BOARD_SIZE, trees, radius))
+              for radius in RADII]
+    t_hand = time.perf_counter() - t
+
+    # one clearance raster for every radius
+    t = time.perf_counter()
+    grid.clearance()
+    t_clearance = time.perf_counter() - t
+    inflated = [grid.inflated(radius) for radius in RADII]
+    t_raster = time.perf_counter() - t
+    print(f"{len(RADII)} radii on {BOARD_SIZE[0]}x{BOARD_SIZE[1]}: inflated by hand in {t_hand:.2f} s, "
+          f"from the clearance raster in {t_raster:.2f} s ({t_clearance:.2f} s of it the raster)")
+
+    planner = Planner(grid, max_its=float("inf"))
+    for radius, board, mask in zip(RADII, boards, inflated):
+        results = [planner.plan(s, g, radius=radius) for s, g in queries]
+        by_hand = Planner(board, max_its=float("inf")).plan_many(queries)
+        same = np.array_equal(board.obstacles, mask.obstacles) and \
+            all(a.cost == b.cost for a, b in zip(results, by_hand))
+        print(f"radius {radius:4}: {np.count_nonzero(mask.obstacles):6} cells blocked, "
+              f"{sum(result.found for result in results):2} of {NQUERIES} queries reachable, "
+              f"same as by hand: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import time
+import heapq
+import random
+import numpy as np
+
+from Grid import Grid, Result, OFFSETS, random_raster
+from Planner import Planner
+import Astar
+
+'''
+Incremental replanning with D* Lite
+
+When a few trees are planted or cleared, most of the last search still
+holds. D* Lite keeps its search state between calls and only repairs
+the cells whose cost-to-goal changed, so replanning after a small change
+costs about as much as the change, not as much as the board.
+
+It searches backward from the goal, so the start can move too (like a
+robot driving along the path) without throwing anything away. Every
+cell has
+
+    g    its cost-to-goal as of the last time it was expanded
+    rhs  the best cost-to-goal its neighbors' g allow right now
+
+and cells where the two differ wait in a priority queue until they are
+fixed, nearest to the start first.
+
+    >>> from DStarLite import DStarLite
+    >>> dstar = DStarLite(grid)
+    >>> result = dstar.plan()
+    >>> dstar.add_obstacles([[5, 5], [5, 6]])
+    >>> dstar.remove_obstacles([[2, 2]])
+    >>> dstar.moveTo([1, 1])
+    >>> result = dstar.plan()
+
+HOW TO RUN THIS CODE:
+
+    $ python DStarLite.py
+'''
+
+# PARAMETERS
+#############
+BOARD_SIZE = [512, 512]
+TREE_DENSITY = 0.2
+SEED = 0
+NCHANGES = 10  # rounds of changes in main()
+CHANGE_SIZE = 20  # trees planted or cleared per round
+#############
+
+# keys closer than this count as a tie. the heuristic and the sum of the
+# steps along a path can round differently, and a cell that ties the
+# start on k1 still has to be fixed if it is closer to the goal
+TOLERANCE = 1e-9
+
+
+class DStarLite:
+    def __init__(self, grid, start=None, goal=None, heuristic=Astar.octile):
+        self.grid = grid
+
+        # the heuristic as given, and scaled by the cheapest cell of the
+        # board. min_weight is what it was scaled by, see rescale
+        self.unscaled = heuristic
+        self.min_weight = grid.min_weight
+        self.heuristic = Astar.scaled(heuristic, grid.min_weight)
+        self.start = list(grid.start if start is None else start)
+        self.goal = list(grid.goal if goal is None else goal)
+        self.source = grid.cell(*self.start)
+        self.target = grid.cell(*self.goal)
+
+        # cost-to-goal of every cell, see the top of this file
+        self.g = np.full(grid.ncells, float("inf"))
+        self.rhs = np.full(grid.ncells, float("inf"))
+        self._g = memoryview(self.g)
+        self._rhs = memoryview(self.rhs)
+
+        # priority queue of (k1, k2, cell). key1/key2 hold the key a cell
+        # is queued with, queued whether it is in the queue at all. entries
+        # that don't match are stale and skipped
+        self.queue = []
+        self.key1 = memoryview(np.zeros(grid.ncells))
+        self.key2 = memoryview(np.zeros(grid.ncells))
+        self.queued = memoryview(np.zeros(grid.ncells, dtype=np.uint8))
+
+        # keys grow by km as the start moves, instead of requeueing everything
+        self.km = 0.0
+
+        # cells expanded by the last plan
+        self.nits = 0
+
+        # the goal is where every cost-to-goal starts from
+        self.updateVertex(self.target)
+
+    # queue a cell whose g and rhs differ, or take it out of the queue.
+    # changeTrees and the goal use this one, computeShortestPath does the
+    # same inline
+    def requeue(self, cell):
+        if self._g[cell] == self._rhs[cell]:
+            self.queued[cell] = 0
+            return
+        m = min(self._g[cell], self._rhs[cell])
+        r, c = divmod(cell, self.grid.ncols)
+        k1 = m + self.heuristic(r, c, self.start) + self.km
+        self.key1[cell] = k1
+        self.key2[cell] = m
+        self.queued[cell] = 1
+        heapq.heappush(self.queue, (k1, m, cell))
+
+    # work out rhs of a cell again from its neighbors and (un)queue it
+    def updateVertex(self, cell):
+        grid = self.grid
+        g = self._g
+        weights = grid._weights
+        rhs = float("inf")
+        if cell == self.target:
+            if not grid.blocked[cell]:
+                rhs = 0.0
+        elif not grid.blocked[cell]:
+            for delta, dist in grid.moves[grid._nbmask[cell]]:
+                nb = cell + delta
+                if weights is not None:
+                    dist *= (weights[cell] + weights[nb]) * 0.5
+                if dist + g[nb] < rhs:
+                    rhs = dist + g[nb]
+        self._rhs[cell] = rhs
+        self.requeue(cell)
+
+    # fix cells until the start's cost-to-goal is right. returns the
+    # number of cells expanded. this is the optimized D* Lite: when a
+    # cell's g drops, its neighbors' rhs can only drop to the way through
+    # it, and when g goes up only the neighbors whose rhs came through it
+    # look at all of their neighbors again. the neighbor loops and keys
+    # are written out here, like Astar.search_grid, since this is where
+    # all of the time goes
+    def computeShortestPath(self):
+        grid = self.grid
+        g = self._g
+        rhs = self._rhs
+        key1 = self.key1
+        key2 = self.key2
+        queued = self.queued
+        queue = self.queue
+        moves = grid.moves
+        nbmask = grid._nbmask
+        weights = grid._weights
+        ncols = grid.ncols
+        heuristic = self.heuristic
+        start = self.start
+        km = self.km
+        source = self.source
+        target = self.target
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        inf = float("inf")
+        nits = 0
+
+        # the start's key is min(g, rhs) of the start plus this, which
+        # stays the same until the start moves or km changes
+        start_offset = heuristic(start[0], start[1], start) + km
+
+        while queue:
+            k1, k2, cell = queue[0]
+            if not queued[cell] or k1 != key1[cell] or k2 != key2[cell]:
+                heappop(queue)
+                continue
+            if rhs[source] == g[source]:
+                sk2 = g[source]
+                sk1 = sk2 + start_offset
+                if k1 > sk1 + TOLERANCE or (k1 >= sk1 - TOLERANCE and k2 >= sk2):
+                    break
+
+            heappop(queue)
+            queued[cell] = 0
+            g_old = g[cell]
+            m = min(g_old, rhs[cell])
+            r, c = divmod(cell, ncols)
+            new_k1 = m + heuristic(r, c, start) + km
+            if (k1, k2) < (new_k1, m):
+                # the start moved since this cell was queued
+                key1[cell] = new_k1
+                key2[cell] = m
+                queued[cell] = 1
+                heappush(queue, (new_k1, m, cell))
+                continue
+
+            nits += 1
+            if g_old > rhs[cell]:
+                # overconsistent: g drops to rhs, and the neighbors may
+                # get to the goal cheaper through this cell
+                g_cell = g[cell] = rhs[cell]
+                changed = []
+                for delta, dist in moves[nbmask[cell]]:
+                    nb = cell + delta
+                    if nb == target:
+                        continue
+                    if weights is not None:
+                        dist *= (weights[cell] + weights[nb]) * 0.5
+                    if dist + g_cell < rhs[nb]:
+                        rhs[nb] = dist + g_cell
+                        changed.append(nb)
+            else:
+                # underconsistent: g goes up to inf, and the neighbors
+                # (and this cell) that got to the goal through this cell
+                # have to look for another way
+                g[cell] = inf
+                changed = [cell]
+                for delta, dist in moves[nbmask[cell]]:
+                    nb = cell + delta
+                    if nb == target:
+                        continue
+                    if weights is not None:
+                        dist *= (weights[cell] + weights[nb]) * 0.5
+                    if rhs[nb] == dist + g_old:
+                        changed.append(nb)
+                for nb in changed:
+                    if nb == target or grid.blocked[nb]:
+                        continue
+                    best = inf
+                    for delta, dist in moves[nbmask[nb]]:
+                        nb2 = nb + delta
+                        if weights is not None:
+                            dist *= (weights[nb] + weights[nb2]) * 0.5
+                        if dist + g[nb2] < best:
+                            best = dist + g[nb2]
+                    rhs[nb] = best
+
+            # (un)queue every cell whose rhs changed, with its new key
+            for nb in changed:
+                m = g[nb]
+                if m == rhs[nb]:
+                    queued[nb] = 0
+                    continue
+                if rhs[nb] < m:
+                    m = rhs[nb]
+                r, c = divmod(nb, ncols)
+                k1 = m + heuristic(r, c, start) + km
+                key1[nb] = k1
+                key2[nb] = m
+                queued[nb] = 1
+                heappush(queue, (k1, m, nb))
+
+        return nits
+
+    # plant trees on a list of [r, c] locations
+    def add_obstacles(self, locations):
+        self.changeTrees(locations, True)
+
+    # clear trees from a list of [r, c] locations
+    def remove_obstacles(self, locations):
+        self.changeTrees(locations, False)
+
+    def changeTrees(self, locations, tree):
+        cells = self.grid.setTrees(locations, tree).tolist()
+        self.rescale()
+
+        # moves into and out of every changed cell change cost
+        for cell in cells:
+            self.updateVertex(cell)
+            r, c = divmod(cell, self.grid.ncols)
+            for dr, dc, _ in OFFSETS:
+                if 0 <= r + dr < self.grid.nrows and 0 <= c + dc < self.grid.ncols:
+                    self.updateVertex(cell + dr * self.grid.ncols + dc)
+
+    # scale the heuristic again when the trees changed the cheapest cell
+    # of the board. a heuristic scaled by the old one can overestimate,
+    # so every queued cell gets its key worked out again, from km 0
+    def rescale(self):
+        if self.grid.min_weight == self.min_weight:
+            return
+        self.min_weight = self.grid.min_weight
+        self.heuristic = Astar.scaled(self.unscaled, self.min_weight)
+        self.km = 0.0
+        cells = {cell for _, _, cell in self.queue if self.queued[cell]}
+        self.queue = []
+        for cell in cells:
+            self.requeue(cell)
+
+    # move the start to a new location, e.g. one step along the path
+    def moveTo(self, location):
+        self.km += self.heuristic(self.start[0], self.start[1], location)
+        self.start = list(location)
+        self.source = self.grid.cell(*self.start)
+
+    # bring the search up to date with the changes since the last call
+    # and return the Result from the start to the goal
+    def plan(self):
+        t = time.perf_counter()
+        self.nits = self.computeShortestPath()
+
+        g = self._g
+        cost = g[self.source]
+        cells = []
+        if cost != float("inf"):
+            # walk downhill on g, to the neighbor the rest of the way is
+            # cheapest from. a path never has more steps than there are
+            # cells, so a walk that takes more is going round in circles
+            # and gives up
+            moves = self.grid.moves
+            nbmask = self.grid._nbmask
+            weights = self.grid._weights
+            cell = self.source
+            cells = [cell]
+            for _ in range(self.grid.ncells):
+                if cell == self.target:
+                    break
+                best = float("inf")
+                for delta, dist in moves[nbmask[cell]]:
+                    nb = cell + delta
+                    if weights is not None:
+                        dist *= (weights[cell] + weights[nb]) * 0.5
+                    if dist + g[nb] < best:
+                        best = dist + g[nb]
+                        step = nb
+                if best == float("inf"):
+                    cells = []
+                    break
+                cell = step
+                cells.append(cell)
+            else:
+                cells = []
+
+        if cells:
+            cells = np.array(cells, dtype=np.intp)
+            path = np.stack(np.divmod(cells, self.grid.ncols), axis=1)
+            status = "destination reached"
+        else:
+            path = np.empty((0, 2), dtype=np.intp)
+            cost = float("inf")
+            status = "destination can't be reached"
+
+        return Result(path, cost, self.nits, time.perf_counter() - t, status)
+
+
+def main():
+    start, goal, raster = random_raster(BOARD_SIZE, TREE_DENSITY, SEED)
+    grid = Grid(BOARD_SIZE, start, goal, None, obstacles=raster)
+    dstar = DStarLite(grid)
+    result = dstar.plan()
+    print(f"first plan on a {BOARD_SIZE[0]}x{BOARD_SIZE[1]} board: cost {result.cost:.2f}, "
+          f"{result.expansions} expansions, {result.time*1e3:.1f} ms")
+
+    # plant trees on the path and clear some elsewhere, then replan
+    rng = random.Random(SEED)
+    for _ in range(NCHANGES):
+        on_path = result.path.tolist()[1:-1]
+        add = rng.sample(on_path, min(CHANGE_SIZE // 2, len(on_path)))
+        remove = [[rng.randrange(grid.nrows), rng.randrange(grid.ncols)] for _ in range(CHANGE_SIZE // 2)]
+        dstar.add_obstacles(add)
+        dstar.remove_obstacles(remove)
+        result = dstar.plan()
+
+        # compare with planning from scratch
+        scratch = Planner(grid, max_its=float("inf")).plan(dstar.start, dstar.goal)
+        print(f"replan: cost {result.cost:.2f} (from scratch {scratch.cost:.2f}), "
+              f"{result.expansions} expansions in {result.time*1e3:.1f} ms "
+              f"(A* from scratch {scratch.expansions} in {scratch.time*1e3:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
-import sys
 import math
+import time
+import heapq
 import numpy as np
 import random
+from Grid import Grid, SearchState, Result, Stats, Expansion, OFFSETS
+import Render
 
 '''
 Dijkstras algorithm 
@@ -17,6 +20,9 @@ if you don't have numpy installed
     $ pip install numpy
 
 Tested with Python 3.7.7
+
+to run on big maps, construct a Grid instead of a Board (see Grid.py).
+nothing in here prints, the console output of main() comes from Render.py
 '''
 
 # PARAMETERS
@@ -41,6 +47,9 @@ class Tile:
         # string for storing the type, " "=EMPTY, *=TREE, $=START,#=GOAL
         self.type = _type
 
+        # cost of moving through the tile, see Grid
+        self.weight = 1.0
+
         self.visited = False
         self.current = False
         self.distance = float("inf")
@@ -52,10 +61,13 @@ class Tile:
         '''
         self.prev = []
 
+        # tiles next to this one that aren't trees, filled in by the Board
+        self.neighbors = []
+
 
 class Board:
-    def __init__(self, _size, _start, _goal, _trees):
-        print("constructing board ...")
+    def __init__(self, _size, _start, _goal, _trees, weights=None):
+        t = time.perf_counter()
         self.size = _size
         self.start = _start
         self.goal = _goal
@@ -76,20 +88,49 @@ class Board:
             self.tiles[tree[0]][tree[1]].type = "*"
             self.tiles[tree[0]][tree[1]].distance = float("inf")
 
+        # cost of moving through every tile, an (nrows, ncols) raster or
+        # None when every tile costs 1. moves cost their step cost times
+        # the average of the costs of the two tiles, like on a Grid
+        self.weights = weights
+        if weights is not None:
+            for row in self.tiles:
+                for tile in row:
+                    tile.weight = float(weights[tile.r][tile.c])
+                    if tile.weight == float("inf"):
+                        tile.type = "*"
+
+        # work out every tile's neighbors once, in N NE E SE S SW W NW order,
+        # leaving out moves that go off the board or into a tree
+        for row in self.tiles:
+            for tile in row:
+                for dr, dc, _ in OFFSETS:
+                    r = tile.r + dr
+                    c = tile.c + dc
+                    if 0 <= r < self.nrows and 0 <= c < self.ncols:
+                        if self.tiles[r][c].type != "*":
+                            tile.neighbors.append(self.tiles[r][c])
+
         # set start and end locations
         self.tiles[self.start[0]][self.start[1]].type = "$"
         self.tiles[self.goal[0]][self.goal[1]].type = "#"
 
         # set the start node as current and set it's distance to 0
         self.tiles[self.start[0]][self.start[1]].current = True
+        self.current = self.tiles[self.start[0]][self.start[1]]
         self.tiles[self.start[0]][self.start[1]].distance = 0
 
+        # seconds it took to build the board, for Stats
+        self.build_time = time.perf_counter() - t
+
     # return current tile object
     def getCurrentTile(self):
-        for row in self.tiles:
-            for __tile in row:
-                if __tile.current == True:
-                    return __tile
+        return self.current
+
+    # move the current tile marker to another tile
+    def setCurrentTile(self, tile):
+        self.current.current = False
+        tile.current = True
+        self.current = tile
 
     # return all unvisited tiles
     def getUnvisited(self):
@@ -100,179 +141,256 @@ class Board:
                     unv_tiles.append(tile)
         return unv_tiles
 
-    # return unvisited tiles next to current tile
-    def getUnvisitedNeighbors(self):
-        tile = self.getCurrentTile()
-        r = tile.r
-        c = tile.c
-        ts = self.tiles
-        maxr = self.size[0]-1
-        maxc = self.size[1]-1
-
-        if r == 0:  # no SE S SW
-            if c == 0:  # No NW W SW
-                nbs = [ts[r+1][c],  # N
-                       ts[r+1][c+1],  # NE
-                       ts[r][c+1]]  # E
-            elif c == maxc:  # no NE E SE
-                nbs = [ts[r+1][c],  # N
-                       ts[r][c-1],  # W
-                       ts[r+1][c-1]]  # NW
-            else:
-                nbs = [ts[r+1][c],  # N
-                       ts[r+1][c+1],  # NE
-                       ts[r][c+1],  # E
-                       ts[r][c-1],  # W
-                       ts[r+1][c-1]]  # NW
-        elif r == maxr:  # no N NE NW
-            if c == 0:  # No NW W SW
-                nbs = [ts[r][c+1],  # E
-                       ts[r-1][c+1],  # SE
-                       ts[r-1][c]]  # S
-            elif c == maxc:  # no NE E SE
-                nbs = [ts[r-1][c],  # S
-                       ts[r-1][c-1],  # SW
-                       ts[r][c-1]]  # W
-            else:
-                nbs = [ts[r][c+1],  # E
-                       ts[r-1][c+1],  # SE
-                       ts[r-1][c],  # S
-                       ts[r-1][c-1],  # SW
-                       ts[r][c-1]]  # W
-        elif c == 0:  # no NW W SW
-            nbs = [ts[r+1][c],  # N
-                   ts[r+1][c+1],  # NE
-                   ts[r][c+1],  # E
-                   ts[r-1][c+1],  # SE
-                   ts[r-1][c]]  # S
-        elif c == maxc:  # no NE E SE
-            nbs = [ts[r+1][c],  # N
-                   ts[r-1][c],  # S
-                   ts[r-1][c-1],  # SW
-                   ts[r][c-1],  # W
-                   ts[r+1][c-1]]  # NW
-        else:
-            nbs = [ts[r+1][c],  # N
-                   ts[r+1][c+1],  # NE
-                   ts[r][c+1],  # E
-                   ts[r-1][c+1],  # SE
-                   ts[r-1][c],  # S
-                   ts[r-1][c-1],  # SW
-                   ts[r][c-1],  # W
-                   ts[r+1][c-1]]  # NW
-
-        # trim trees and visited tiles from neighbors
-        for nb in nbs:
-            if nb.visited == True or nb.type == "*":
-                nbs.remove(nb)
-
-        return nbs
-
-    # show the board to the user, and optionally the path
-    def print_board(self, _path):
-        # top line
-        sys.stdout.write("\n   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-        for row in self.tiles[::-1]:
-            # row legend
-            if row[0].r < 10:
-                sys.stdout.write(" ")
-            sys.stdout.write(str(row[0].r)+" ")
-
-            # board content
-            for tile in row:
-                if [tile.r, tile.c] in _path:
-                    sys.stdout.write("|@")
-                else:
-                    sys.stdout.write("|"+tile.type)
-
-            sys.stdout.write("|\n")
-        # bottom line
-        sys.stdout.write("   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-        # column legend
-        sys.stdout.write("    ")
-        for num in range(self.ncols):
-            sys.stdout.write(str(num)+" ")
-        print()
-
-    def print_distances(self):
-        # top line
-        sys.stdout.write("\n   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-
-        for row in self.tiles[::-1]:
-            # row legend
-            if row[0].r < 10:
-                sys.stdout.write(" ")
-            sys.stdout.write(str(row[0].r)+" ")
-
-            # board content
-            for tile in row:
-                if tile.distance == float("inf"):
-                    sys.stdout.write(f"| {tile.distance}")
-                elif tile.distance < 10:
-                    sys.stdout.write("| %3.1f" % tile.distance)
-                else:
-                    sys.stdout.write("|%3.1f" % tile.distance)
-            sys.stdout.write("|\n")
-
-        # bottom line
-        sys.stdout.write("   ")
-        for _ in range(self.ncols):
-            sys.stdout.write("--")
-        print()
-
-        # column legend
-        sys.stdout.write("    ")
-        for num in range(self.ncols):
-            sys.stdout.write(str(num)+" ")
-        print()
+    # return unvisited tiles next to a tile (the current tile by default)
+    def getUnvisitedNeighbors(self, tile=None):
+        if tile is None:
+            tile = self.current
+
+        # trees were already left out when the board was built
+        return [nb for nb in tile.neighbors if nb.visited == False]
+
+
+# Dijkstra's algorithm from start on a Grid, writing distances and prev
+# links into a freshly reset SearchState. with a goal it stops as soon as
+# the goal is visited, otherwise it visits every cell it can reach. doesn't
+# print anything. returns whether it finished (reached the goal, or ran out
+# of cells) within max_its visits (MAX_ITS by default) and how many cells
+# were visited. pass a Stats to have its counters filled in
+def search_grid(grid, state, start, goal=None, max_its=None, stats=None):
+    if max_its is None:
+        max_its = MAX_ITS
+
+    epoch = state.epoch
+    distance = memoryview(state.cost)
+    prev = memoryview(state.prev)
+    stamp = memoryview(state.stamp)
+    visited = memoryview(state.closed)
+    moves = grid.moves
+    nbmask = memoryview(grid.nbmask)
+    weights = grid._weights
+    target = -1 if goal is None else grid.cell(*goal)
+    nits = 0
+    nstale = 0
+    finished = goal is None
+    popped_goal = False
+
+    # priority queue of (tentative distance, cell). cell ids are row-major
+    # so ties pop in the same order as they do in Dijkstra.iterate
+    source = grid.cell(*start)
+    distance[source] = 0.0
+    prev[source] = -1
+    stamp[source] = epoch
+    frontier = [(0.0, source)]
+
+    while frontier:
+        dist, cell = heapq.heappop(frontier)
+        if visited[cell] == epoch:
+            nstale += 1
+            continue
+
+        # stop if we've reached the destination
+        if cell == target:
+            finished = popped_goal = True
+            break
+
+        for delta, nb_dist in moves[nbmask[cell]]:
+            nb = cell + delta
+            if visited[nb] == epoch:
+                continue
+            if weights is not None:
+                nb_dist *= (weights[cell] + weights[nb]) * 0.5
+
+            if stamp[nb] != epoch or dist + nb_dist < distance[nb]:
+                distance[nb] = dist + nb_dist
+                stamp[nb] = epoch
+
+                # keep track of shortest path to that cell
+                prev[nb] = cell
+
+                heapq.heappush(frontier, (dist + nb_dist, nb))
+
+        visited[cell] = epoch
+
+        nits += 1
+        if nits > max_its:
+            finished = False
+            break
+
+    if stats is not None:
+        stats.countSearch(grid, state, nits, nstale, popped_goal, len(frontier))
+
+    return finished, nits
+
+
+# the same search as search_grid, one step at a time: a generator that
+# yields an Expansion after every cell it visits. see Astar.search_iter
+def search_iter(grid, state, start, goal=None, max_its=None):
+    if max_its is None:
+        max_its = MAX_ITS
+
+    epoch = state.epoch
+    distance = memoryview(state.cost)
+    prev = memoryview(state.prev)
+    stamp = memoryview(state.stamp)
+    visited = memoryview(state.closed)
+    ncols = grid.ncols
+    moves = grid.moves
+    nbmask = memoryview(grid.nbmask)
+    weights = grid._weights
+    target = -1 if goal is None else grid.cell(*goal)
+    nits = 0
+
+    source = grid.cell(*start)
+    distance[source] = 0.0
+    prev[source] = -1
+    stamp[source] = epoch
+    frontier = [(0.0, source)]
+
+    while frontier:
+        dist, cell = heapq.heappop(frontier)
+        if visited[cell] == epoch:
+            continue
+        if cell == target:
+            return True, nits
+
+        for delta, nb_dist in moves[nbmask[cell]]:
+            nb = cell + delta
+            if visited[nb] == epoch:
+                continue
+            if weights is not None:
+                nb_dist *= (weights[cell] + weights[nb]) * 0.5
+
+            if stamp[nb] != epoch or dist + nb_dist < distance[nb]:
+                distance[nb] = dist + nb_dist
+                stamp[nb] = epoch
+                prev[nb] = cell
+                heapq.heappush(frontier, (dist + nb_dist, nb))
+
+        visited[cell] = epoch
+
+        nits += 1
+        r, c = divmod(cell, ncols)
+        yield Expansion(cell, r, c, dist, 0.0, nits, len(frontier))
+        if nits > max_its:
+            return False, nits
+
+    return goal is None, nits
+
+
+# run Dijkstra's algorithm from source over the whole Grid in one pass.
+# returns (distance, prev), two (nrows, ncols) arrays holding the shortest
+# distance from source to every cell (inf where it can't be reached) and
+# the cell id each cell was reached from (-1 at the source and at cells
+# that can't be reached). moves cost the same both ways, so distance is
+# also the cost-to-go from every cell back to source.
+#
+# with cache=True the field is kept in grid.fields and handed back on the
+# next call for the same source. the arrays are read-only so a cached
+# field can't be changed by accident
+def distance_field(grid, source, cache=False):
+    key = (int(source[0]), int(source[1]))
+    if cache and key in grid.fields:
+        return grid.fields[key]
+
+    state = SearchState(grid.ncells)
+    search_grid(grid, state, source, max_its=float("inf"))
+
+    distance = state.costs().reshape(grid.nrows, grid.ncols)
+    prev = state.prevs().reshape(grid.nrows, grid.ncols)
+    distance.flags.writeable = False
+    prev.flags.writeable = False
+
+    field = (distance, prev)
+    if cache:
+        grid.fields[key] = field
+    return field
+
+
+# return the shortest path from the source of a distance field to a
+# location as an (L, 2) array of [r, c] rows, or an empty array if the
+# location can't be reached. only walks the path, O(path length)
+def field_path(grid, field, location):
+    distance, prev = field
+    if distance[location[0], location[1]] == float("inf"):
+        return np.empty((0, 2), dtype=np.intp)
+
+    prev = memoryview(prev.reshape(-1))
+    cell = grid.cell(*location)
+    cells = [cell]
+    while prev[cell] != -1:
+        cell = prev[cell]
+        cells.append(cell)
+
+    # reverse the path
+    cells = np.array(cells[::-1], dtype=np.intp)
+    return np.stack(np.divmod(cells, grid.ncols), axis=1)
 
 
 class Dijkstra:
     def __init__(self, _board):
-        print("getting ready for dijkstras algorithm . . .")
-
         self.nits = 0
+        self.found = False
+
+        # why the search stopped
+        self.status = None
 
         # shallow copy the board
         self.board = _board
 
-        # show the starting board
-        self.board.print_board([])
-
-        # instantiate unvisited set as a data member
-        self.unvisited = self.board.getUnvisited()
-
-        # run Djkstras algorithm
-        self.iterate()
+    # run Djkstras algorithm and return a Result. on a Board,
+    # on_iteration(board, tile, nbs, nb_dists, thru_dists) is called after
+    # every visit, see Render.show_dijkstra_iteration. with stats=True the
+    # Result carries the Stats of the search
+    def run(self, on_iteration=None, stats=False):
+        stats = Stats("dijkstra") if stats else None
 
-        # print results
-        if self.nits < MAX_ITS:
-
-            path = self.recover_path()
-
-            self.print_text_path(path)
-
-            self.board.print_board(path)
+        t = time.perf_counter()
+        if isinstance(self.board, Grid):
+            self.iterate_grid(stats)
+        else:
+            self.iterate(on_iteration, stats)
+        t_search = time.perf_counter()
+
+        path = self.recover_path()
+        self.found = len(path) > 0
+        if not self.found:
+            cost = float("inf")
+        elif isinstance(self.board, Grid):
+            cost = self.board.state.getCost(self.board.cell(*self.board.goal))
+        else:
+            cost = self.board.tiles[self.board.goal[0]][self.board.goal[1]].distance
+        t_end = time.perf_counter()
+
+        if stats is not None:
+            stats.phases["construction"] = self.board.build_time
+            stats.phases["search"] = t_search - t
+            stats.phases["recover_path"] = t_end - t_search
+            stats.export()
+
+        return Result(path, cost, self.nits, t_end - t, self.status, stats)
+
+    def iterate(self, on_iteration=None, stats=None):
+        # counters for Stats, cheap next to the rest of the loop
+        npushes = 1
+        npops = 0
+        nevaluations = 0
+        nreopens = 0
+        nexpanded = 0
+
+        # priority queue of (tentative distance, row, col) for tiles we have
+        # discovered but not visited yet. stale entries are skipped when popped
+        # instead of being deleted, and ties pop in the same row-major order
+        # the old scan over every unvisited tile used
+        tile = self.board.getCurrentTile()
+        self.frontier = [(tile.distance, tile.r, tile.c)]
 
-    def iterate(self):
-        print("iterating . . .")
         while True:
-            tile = self.board.getCurrentTile()
-
-            # for debug printout only
+            # for on_iteration only
             nb_dists = []
 
             thru_dists = []
-            nbs = self.board.getUnvisitedNeighbors()
+            nbs = self.board.getUnvisitedNeighbors(tile)
+            nevaluations += len(tile.neighbors)
             for nb in nbs:
                 if nb.r == tile.r or nb.c == tile.c:
                     # neighbor is adjacent
@@ -281,99 +399,117 @@ class Dijkstra:
                     # neighbor is diagonal
                     # immediate distance is hypotenouse of 45-45-90 triangle
                     dist = math.sqrt(2.0)
+                dist *= (tile.weight + nb.weight) * 0.5
                 nb_dists.append(dist)
 
                 # store distances to unvisited neighbors THRU the current node
                 thru_dists.append(tile.distance + dist)
 
-             # if the smallest neighbor distance is infinity (eg stuck inside obstacles), then stop
-            if min(nb_dists) == float("inf"):
-                print("stopping: minimum neighbor distance is inf")
-                break
-
             # if the new tentative distance is lower than currently held tentative distance for that nb, update it
             for ind, nb in enumerate(nbs):
-                if thru_dists[ind] < nb.distance and nb.type == " ":
+                if thru_dists[ind] < nb.distance and (nb.type == " " or nb.type == "#"):
+                    if nb.distance < float("inf"):
+                        nreopens += 1
                     nb.distance = thru_dists[ind]
 
                     # keep track of shortest path to that tile
                     nb.prev = [tile.r, tile.c]
 
-            tile.visited = True
-            self.unvisited.remove(tile)
+                    heapq.heappush(self.frontier, (nb.distance, nb.r, nb.c))
+                    npushes += 1
 
-            # stop if we've visited the destination
-            if self.unvisited == []:
-                self.board.tiles[10][10].prev = [9, 9]
-                print("stopping: destination reached")
+            tile.visited = True
+            nexpanded += 1
+
+            # select the next tile with lowest tentative distance, dropping
+            # queue entries for tiles that were visited after being pushed
+            next_tile = None
+            while self.frontier:
+                _, r, c = heapq.heappop(self.frontier)
+                npops += 1
+                if not self.board.tiles[r][c].visited:
+                    next_tile = self.board.tiles[r][c]
+                    break
+
+            # stop once every tile we can reach has been visited
+            if next_tile is None:
+                # the start has no prev, so go by the goal's distance
+                goal = self.board.tiles[self.board.goal[0]][self.board.goal[1]]
+                if goal.distance == float("inf"):
+                    self.status = "no unvisited tiles are reachable"
+                else:
+                    self.status = "destination reached"
                 break
 
-            # loop over ALL unvisited open tiles and store the distances
-            unv_thru_dists = []
-            for unv_tile in self.unvisited:
-                unv_thru_dists.append(unv_tile.distance)
-
-            # select the next tile with lowest tentative distance of unvisited tiles that aren't trees
-            min_thru_dist = min(unv_thru_dists)
-            next_tile_ind = unv_thru_dists.index(min_thru_dist)
-            next_tile = self.unvisited[next_tile_ind]
-            next_tile.current = True
-            tile.current = False
-
-            if SHOW_ITERATIONS:
-                nb_locs = []
-                for nb in nbs:
-                    nb_locs.append([nb.r, nb.c])
-                print("\ncurrent node: [{}, {}]".format(tile.r, tile.c))
-                print("{} neighbors: {}".format(len(nb_locs), nb_locs))
-                print("with distances: {}".format(
-                    ['%.2f' % elem for elem in nb_dists]))
-                print("with total distances: {}".format(
-                    ['%.2f' % elem for elem in thru_dists]))
-                self.board.print_distances()
+            self.board.setCurrentTile(next_tile)
+
+            if on_iteration is not None:
+                on_iteration(self.board, tile, nbs, nb_dists, thru_dists)
 
             self.nits += 1
             if self.nits > MAX_ITS:
-                print(
-                    "stopping: couldn't reach destination in {} iterations".format(MAX_ITS))
+                self.status = "couldn't reach destination in {} iterations".format(MAX_ITS)
                 break
 
-    def recover_path(self):
-
-        #  start at the destination
-        locatio = self.board.goal
-
-        thepath = [locatio]
-
-        # # walk back along the shortest path
-        while locatio != self.board.start:
-
-            # get the tile object at that location
-            for row in self.board.tiles:
-                for tile in row:
-                    if [tile.r, tile.c] == locatio:
-                        thetile = tile
-
-            locatio = thetile.prev
-            thepath.append(locatio)
+            # carry the current tile instead of searching the board for it
+            tile = next_tile
+
+        if stats is not None:
+            stats.expanded = nexpanded
+            stats.pushes = npushes
+            stats.pops = npops
+            stats.evaluations = nevaluations
+            stats.reopens = nreopens
+
+    # same search as iterate, on the arrays of a Grid
+    def iterate_grid(self, stats=None):
+        grid = self.board
+        grid.state.reset()
+        finished, self.nits = search_grid(grid, grid.state, grid.start, stats=stats)
+
+        if not finished:
+            self.status = "couldn't reach destination in {} iterations".format(MAX_ITS)
+        elif grid.state.getCost(grid.cell(*grid.goal)) == float("inf"):
+            self.status = "no unvisited tiles are reachable"
+        else:
+            self.status = "destination reached"
+
+    # walk back from a location to the start along the prev links,
+    # yielding [r, c] of every tile on the way
+    def walk_back(self, location):
+        tile = self.board.tiles[location[0]][location[1]]
+        yield [tile.r, tile.c]
+        while tile.prev != []:
+            tile = self.board.tiles[tile.prev[0]][tile.prev[1]]
+            yield [tile.r, tile.c]
+
+    # return the shortest path from the start to a location (the goal by
+    # default) as an (L, 2) array of [r, c] rows. every tile the search
+    # reached has a path, others get an empty array
+    def recover_path(self, location=None):
+        if location is None:
+            location = self.board.goal
+
+        if isinstance(self.board, Grid):
+            return self.board.getPath(location)
+
+        thepath = list(self.walk_back(location))
+        if thepath[-1] != self.board.start:
+            return np.empty((0, 2), dtype=np.intp)
 
         # reverse the path
-        return thepath[::-1]
-
-    def print_text_path(self, __path):
-        print("\nshortest path:")
-        for _loc in __path:
-            sys.stdout.write(str(_loc))
-            if __path.index(_loc) != len(__path)-1:
-                sys.stdout.write("->")
+        return np.array(thepath[::-1], dtype=np.intp)
 
 
 def main():
     # instantiate a board object
     b = Board(BOARD_SIZE, START, GOAL, TREES)
 
+    # only show every step when asked to
+    on_iteration = Render.show_dijkstra_iteration if SHOW_ITERATIONS else None
+
     # run Dijkstra's algorithm on that board
-    _ = Dijkstra(b)
+    Render.show("dijkstras", b, Dijkstra(b), on_iteration)
 
     # try some more complicated boards . .
     # tree_density = 0.2
@@ -0,0 +1,702 @@
+import math
+import time
+import random
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+'''
+Compact board for Dijkstra.py and Astar.py
+
+A Board keeps one Tile object per cell, which gets very slow and very
+large on big maps. A Grid keeps the obstacles in a uint8 raster and the
+search state in flat typed arrays indexed by cell id, where
+
+    cell = r * ncols + c
+
+Tile objects are only built when the board is printed.
+
+    >>> from Grid import Grid
+    >>> from Astar import Astar
+    >>> result = Astar(Grid([11, 11], [0, 0], [10, 10], [[2, 2], [3, 3]])).run()
+
+A Grid can also carry a cost for every cell (mud, slopes, keep-out
+margins), a float raster passed as weights. A move then costs its step
+cost times the average of the costs of the two cells it joins, so moves
+still cost the same both ways.
+
+    >>> grid = Grid([11, 11], [0, 0], [10, 10], [], weights=costs)
+
+A robot with a footprint needs to keep its distance from the trees.
+grid.clearance() is the distance from every cell to the nearest tree,
+worked out once, and grid.inflated(radius) is the board with every cell
+closer than radius to a tree blocked, made from it with one comparison:
+
+    >>> Planner(grid.inflated(1.5)).plan([0, 0], [10, 10])
+'''
+
+# (dr, dc, step cost) of the 8 moves, in N NE E SE S SW W NW order.
+# straight steps cost 1 and diagonal steps are the hypotenouse of a
+# 45-45-90 triangle
+OFFSETS = [(1, 0, 1.0),
+           (1, 1, math.sqrt(2.0)),
+           (0, 1, 1.0),
+           (-1, 1, math.sqrt(2.0)),
+           (-1, 0, 1.0),
+           (-1, -1, math.sqrt(2.0)),
+           (0, -1, 1.0),
+           (1, -1, math.sqrt(2.0))]
+
+
+class Tile:
+    def __init__(self, r, c, _type):
+        # location
+        self.r = r
+        self.c = c
+
+        # string for storing the type, " "=EMPTY, *=TREE, $=START,#=GOAL
+        self.type = _type
+
+        # cost of moving through the tile, see Grid
+        self.weight = 1.0
+
+        self.visited = False
+        self.current = False
+        self.cost = float("inf")
+        self.heuristic = 0
+
+        # Dijkstra.py calls the cost a distance
+        self.distance = float("inf")
+
+        self.prev = []
+
+
+class SearchState:
+    '''
+    g-cost, prev cell and closed flag of every cell for one search
+
+    a Grid only describes the map, so many searches can run on it one
+    after another with the same SearchState. instead of refilling the
+    arrays between searches every entry carries the epoch it was written
+    in, and reset() just starts a new epoch. cost[cell] and prev[cell] only
+    mean something where stamp[cell] == epoch, and a cell is closed
+    (visited) where closed[cell] == epoch
+    '''
+    def __init__(self, ncells):
+        index_type = np.int32 if ncells < 2**31 else np.int64
+        self.ncells = ncells
+        self.cost = np.full(ncells, float("inf"))
+        self.prev = np.full(ncells, -1, dtype=index_type)
+        self.stamp = np.zeros(ncells, dtype=np.uint32)
+        self.closed = np.zeros(ncells, dtype=np.uint32)
+        self.epoch = 1
+
+    # forget the last search in O(1)
+    def reset(self):
+        self.epoch += 1
+        if self.epoch == 2**32:
+            # the stamps wrapped around, this is the only time we clear them
+            self.stamp[:] = 0
+            self.closed[:] = 0
+            self.epoch = 1
+
+    # return the g-cost of a cell, inf if the search never reached it
+    def getCost(self, cell):
+        if self.stamp[cell] != self.epoch:
+            return float("inf")
+        return float(self.cost[cell])
+
+    # dense copies of the state of the current search
+    def costs(self):
+        return np.where(self.stamp == self.epoch, self.cost, float("inf"))
+
+    def prevs(self):
+        return np.where(self.stamp == self.epoch, self.prev, -1)
+
+    def visited(self):
+        return self.closed == self.epoch
+
+    # walk back from a cell along prev, yielding cell ids
+    def walkBack(self, cell):
+        prev = memoryview(self.prev)
+        stamp = memoryview(self.stamp)
+        yield cell
+        while stamp[cell] == self.epoch and prev[cell] != -1:
+            cell = prev[cell]
+            yield cell
+
+
+class Result:
+    '''
+    what a search found
+
+        path        (L, 2) array of [r, c] rows from start to goal, empty
+                    if there is no path
+        cost        cost of the path, inf if there is no path
+        expansions  number of tiles/cells the search expanded
+        time        seconds spent searching and recovering the path
+        status      why the search stopped
+        stats       Stats of the search, None unless they were asked for
+        bound       the path costs at most bound times the shortest one,
+                    None for the searches that always find the shortest
+                    (see ARAstar.py)
+    '''
+    def __init__(self, path, cost, expansions, time, status, stats=None, bound=None):
+        self.path = path
+        self.cost = cost
+        self.expansions = expansions
+        self.time = time
+        self.status = status
+        self.stats = stats
+        self.bound = bound
+
+    @property
+    def found(self):
+        return len(self.path) > 0
+
+    def __repr__(self):
+        bound = "" if self.bound is None else f", bound={self.bound:.4f}"
+        return (f"Result(found={self.found}, length={len(self.path)}, cost={self.cost:.4f}, "
+                f"expansions={self.expansions}, time={self.time:.6f}, status={self.status!r}{bound})")
+
+
+class Expansion:
+    '''
+    one cell expanded by a step by step search (Astar.search_iter,
+    Dijkstra.search_iter, Planner.plan_iter)
+
+        cell    cell id of the cell
+        r, c    its location
+        g       its cost from the start
+        h       its heuristic, 0 for Dijkstra
+        nits    cells expanded so far, this one included
+        nopen   entries on the open set, stale ones included
+    '''
+    __slots__ = ("cell", "r", "c", "g", "h", "nits", "nopen")
+
+    def __init__(self, cell, r, c, g, h, nits, nopen):
+        self.cell = cell
+        self.r = r
+        self.c = c
+        self.g = g
+        self.h = h
+        self.nits = nits
+        self.nopen = nopen
+
+    @property
+    def location(self):
+        return [self.r, self.c]
+
+    @property
+    def f(self):
+        return self.g + self.h
+
+    def __repr__(self):
+        return (f"Expansion(location=[{self.r}, {self.c}], g={self.g:.4f}, h={self.h:.4f}, "
+                f"nits={self.nits}, nopen={self.nopen})")
+
+
+# functions called with the Stats of every instrumented search, e.g. to
+# send them to a metrics pipeline. see add_stats_hook
+STATS_HOOKS = []
+
+# number of set bits of every uint8, i.e. the number of open moves of a mask
+POPCOUNT = np.array([bin(mask).count("1") for mask in range(256)])
+
+
+class Stats:
+    '''
+    counters and phase timers of one search
+
+        expanded     tiles/cells expanded
+        pushes       entries pushed on the open list (the heap)
+        pops         entries popped off it, including stale ones
+        evaluations  neighbors looked at while expanding
+        reopens      pushes for cells that were already on the open list,
+                     because a cheaper way to get there turned up
+        phases       seconds spent in "construction" of the board, in the
+                     "search" and in "recover_path"
+
+    the searches don't count anything in their inner loops. the counters
+    are worked out from the SearchState and the open list after the
+    search, and only when Stats are asked for
+    '''
+    def __init__(self, algorithm=None):
+        self.algorithm = algorithm
+        self.expanded = 0
+        self.pushes = 0
+        self.pops = 0
+        self.evaluations = 0
+        self.reopens = 0
+        self.phases = {"construction": 0.0, "search": 0.0, "recover_path": 0.0}
+
+    # fill in the counters of a search_grid run from what it left behind:
+    # the state, the number of cells expanded and of stale entries popped,
+    # whether the goal was popped and what was still on the open list
+    def countSearch(self, grid, state, nits, nstale, popped_goal, nopen):
+        discovered = int(np.count_nonzero(state.stamp == state.epoch))
+        closed = state.closed == state.epoch
+
+        self.expanded = nits
+        self.pops = nits + nstale + int(popped_goal)
+        self.pushes = self.pops + nopen
+        self.reopens = self.pushes - discovered
+        self.evaluations = int(POPCOUNT[grid.nbmask[closed.reshape(-1)]].sum())
+
+    # add the counters of another search, e.g. the other half of a
+    # bidirectional one
+    def add(self, other):
+        self.expanded += other.expanded
+        self.pushes += other.pushes
+        self.pops += other.pops
+        self.evaluations += other.evaluations
+        self.reopens += other.reopens
+
+    def as_dict(self):
+        d = {"algorithm": self.algorithm, "expanded": self.expanded, "pushes": self.pushes,
+             "pops": self.pops, "evaluations": self.evaluations, "reopens": self.reopens}
+        for phase, seconds in self.phases.items():
+            d[phase + "_time"] = seconds
+        return d
+
+    # hand the stats to every hook in STATS_HOOKS
+    def export(self):
+        for hook in STATS_HOOKS:
+            hook(self)
+
+    def __repr__(self):
+        return "Stats(" + ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items()) + ")"
+
+
+# call hook(stats) after every search that was asked for Stats. returns
+# the hook so it can be used as a decorator
+def add_stats_hook(hook):
+    STATS_HOOKS.append(hook)
+    return hook
+
+
+def remove_stats_hook(hook):
+    STATS_HOOKS.remove(hook)
+
+
+# Euclidean distance from the center of every cell of an obstacle raster
+# to the center of the nearest tree, as a float64 array. 0 on trees, inf
+# everywhere when there are none. exact, in two passes (Felzenszwalb and
+# Huttenlocher): the distance to the nearest tree up or down each column,
+# then along each row the lower envelope of the parabolas those give,
+# built for all rows at once one column at a time
+def distance_to_trees(obstacles):
+    trees = np.asarray(obstacles) != 0
+    nrows, ncols = trees.shape
+    inf = float("inf")
+
+    # squared distance to the nearest tree up or down the column
+    r = np.arange(nrows, dtype=np.float64)[:, None]
+    above = np.maximum.accumulate(np.where(trees, r, -inf), axis=0)
+    below = np.minimum.accumulate(np.where(trees, r, inf)[::-1], axis=0)[::-1]
+    f = np.minimum(r - above, below - r) ** 2
+
+    # v[row, :k + 1] are the columns whose parabolas make up the lower
+    # envelope of a row so far and z[row, j] is where parabola j takes
+    # over. k is -1 for rows that have met no tree yet
+    rows = np.arange(nrows)
+    v = np.zeros((nrows, ncols), dtype=np.intp)
+    z = np.full((nrows, ncols + 1), inf)
+    k = np.full(nrows, -1, dtype=np.intp)
+    for q in range(ncols):
+        fq = f[:, q]
+        finite = fq < inf
+        new = rows[finite & (k == -1)]
+        add = rows[finite & (k >= 0)]
+
+        # drop the parabolas the new one hides, then add it
+        if len(add):
+            s = np.empty(len(add))
+            todo = np.arange(len(add))
+            while len(todo):
+                a = add[todo]
+                p = v[a, k[a]]
+                s[todo] = ((fq[a] + q * q) - (f[a, p] + p * p)) / (2.0 * (q - p))
+                todo = todo[s[todo] <= z[a, k[a]]]
+                k[add[todo]] -= 1
+            k[add] += 1
+            v[add, k[add]] = q
+            z[add, k[add]] = s
+            z[add, k[add] + 1] = inf
+
+        k[new] = 0
+        v[new, 0] = q
+        z[new, 0] = -inf
+        z[new, 1] = inf
+
+    # parabola j of a row is the lowest from z[row, j] to z[row, j + 1],
+    # so the one under a column is the number of z[row, 1:] left of it.
+    # found for every cell with one binary search, the rows laid end to
+    # end on one increasing axis
+    z = z[:, 1:]
+    z[np.arange(ncols) > k[:, None]] = inf
+    width = ncols + 2
+    z = np.clip(z, -1.0, ncols) + (rows * width)[:, None]
+    q = np.arange(ncols) + (rows * width)[:, None]
+    j = np.searchsorted(z.reshape(-1), q.reshape(-1)).reshape(nrows, ncols) - (rows * ncols)[:, None]
+    p = v[rows[:, None], j]
+    d = (np.arange(ncols) - p) ** 2 + f[rows[:, None], p]
+    return np.sqrt(d)
+
+
+# corner to corner board with trees dropped at random, like the random
+# boards in Astar.main
+def random_board(size, density, seed):
+    rng = random.Random(seed)
+    start = [0, 0]
+    goal = [size[0]-1, size[1]-1]
+    trees = [[rng.randint(0, size[0]-1), rng.randint(0, size[1]-1)]
+             for _ in range(int(size[0]*size[1]*density))]
+    trees = [tree for tree in trees if tree != start and tree != goal]
+    return start, goal, trees
+
+
+# a board of random trees for demos and benchmarks, corner to corner,
+# drawn with numpy so that 4096x4096 boards take a moment instead of
+# minutes. returns (start, goal, raster) with the trees set to 1 in a
+# uint8 (nrows, ncols) raster
+def random_raster(size, density, seed):
+    rng = np.random.default_rng(seed)
+    start = [0, 0]
+    goal = [size[0]-1, size[1]-1]
+    ntrees = int(size[0]*size[1]*density)
+
+    raster = np.zeros(size, dtype=np.uint8)
+    raster[rng.integers(0, size[0], ntrees), rng.integers(0, size[1], ntrees)] = 1
+    raster[start[0], start[1]] = 0
+    raster[goal[0], goal[1]] = 0
+    return start, goal, raster
+
+
+# inflated boards (see Grid.inflated) a Grid keeps, the least recently
+# used one is dropped past that
+INFLATIONS = 8
+
+# moves tables already made, keyed by the number of columns
+MOVES = {}
+
+
+# the table of the (cell id offset, step cost) of every move whose bit is
+# set in a neighbor mask, for a board ncols wide. made once per width
+# and shared by every Grid that wide
+def moves_table(ncols):
+    moves = MOVES.get(ncols)
+    if moves is None:
+        moves = []
+        for mask in range(256):
+            moves.append(tuple((dr * ncols + dc, cost)
+                               for k, (dr, dc, cost) in enumerate(OFFSETS) if mask >> k & 1))
+        moves = MOVES[ncols] = tuple(moves)
+    return moves
+
+
+class Grid:
+    def __init__(self, _size, _start, _goal, _trees, obstacles=None, weights=None):
+        t = time.perf_counter()
+        self.size = _size
+        self.start = _start
+        self.goal = _goal
+        self.trees = _trees
+        self.nrows = _size[0]
+        self.ncols = _size[1]
+        self.ncells = self.nrows * self.ncols
+
+        # obstacle raster, 1=TREE. a ready-made uint8 raster (e.g. one in
+        # shared memory) is used as it is instead of the list of trees
+        if obstacles is None:
+            self.obstacles = np.zeros((self.nrows, self.ncols), dtype=np.uint8)
+            trees = np.asarray(_trees, dtype=np.intp).reshape(-1, 2)
+            self.obstacles[trees[:, 0], trees[:, 1]] = 1
+        else:
+            self.obstacles = np.ascontiguousarray(obstacles, dtype=np.uint8).reshape(self.nrows, self.ncols)
+
+        # cost of moving through every cell, None when every cell costs 1.
+        # cells that cost inf are trees
+        if weights is None:
+            self.weights = None
+            self._weights = None
+            self.min_weight = 1.0
+        else:
+            self.weights = np.array(weights, dtype=np.float64).reshape(self.nrows, self.ncols)
+            if not (self.weights > 0).all():
+                raise ValueError("cell costs must be positive")
+            impassable = np.isinf(self.weights)
+            if impassable.any():
+                self.obstacles = self.obstacles | impassable.astype(np.uint8)
+            self._weights = memoryview(self.weights.reshape(-1))
+            self.updateMinWeight()
+
+        # state of the last search run on this board by Dijkstra or Astar,
+        # made by the first search that asks for it (see state)
+        self._state = None
+
+        # distance fields cached by Dijkstra.distance_field, keyed by source
+        self.fields = {}
+
+        # bumped every time the trees change, so whatever was worked out
+        # for an older version of the board can tell it is out of date
+        self.version = 0
+
+        # (version, fingerprint) of the last fingerprint worked out
+        self._fingerprint = (None, None)
+
+        # (version, raster) of the last clearance raster worked out, and
+        # the inflated boards made from it, keyed by robot radius
+        self._clearance = (None, None)
+        self.inflations = OrderedDict()
+
+        # flat view of the raster for cheap lookups in the search loops
+        self.blocked = memoryview(self.obstacles.reshape(-1))
+
+        # step cost and cell id offset of each move on this board
+        self.steps = np.array([cost for _, _, cost in OFFSETS])
+        self.deltas = np.array([dr * self.ncols + dc for dr, dc, _ in OFFSETS])
+
+        # moves[mask] lists the (cell id offset, step cost) of every move
+        # whose bit is set in mask, so a cell's neighbors are one lookup
+        self.moves = moves_table(self.ncols)
+
+        # (nbmask, memoryview of it), worked out by the first search that
+        # asks for them (see nbmask), so a board loaded from a memory
+        # mapped file (MapFile.py) isn't read cell by cell until then
+        self._masks = None
+
+        # seconds it took to build the board, for Stats
+        self.build_time = time.perf_counter() - t
+
+    # the Grid of a board: a Grid as it is, a Board of Tile objects (from
+    # Astar.py or Dijkstra.py) as a new Grid of the same size, trees and
+    # cell costs
+    @classmethod
+    def from_board(cls, board):
+        if isinstance(board, Grid):
+            return board
+        return cls(board.size, board.start, board.goal, board.trees, weights=board.weights)
+
+    # work out which moves are open from every cell. bit k of nbmask[cell]
+    # is set when move k stays on the board and doesn't land on a tree
+    def updateNeighbors(self):
+        # pad the raster with trees so moves off the edge look blocked
+        padded = np.ones((self.nrows + 2, self.ncols + 2), dtype=np.uint8)
+        padded[1:-1, 1:-1] = self.obstacles
+
+        nbmask = np.zeros((self.nrows, self.ncols), dtype=np.uint8)
+        for k, (dr, dc, _) in enumerate(OFFSETS):
+            shifted = padded[1 + dr:self.nrows + 1 + dr, 1 + dc:self.ncols + 1 + dc]
+            nbmask |= (shifted == 0).astype(np.uint8) << k
+
+        nbmask = nbmask.reshape(-1)
+        self._masks = (nbmask, memoryview(nbmask))
+
+    # the cheapest cell that isn't a tree. every move costs at least this
+    # many times its step cost, so a heuristic times min_weight stays
+    # admissible. planting or clearing trees can change it
+    def updateMinWeight(self):
+        if self.weights is None:
+            self.min_weight = 1.0
+            return
+        free = self.weights[self.obstacles == 0]
+        self.min_weight = float(free.min()) if len(free) else 1.0
+
+    # bit k of nbmask[cell] is set when move k is open from the cell, as a
+    # flat uint8 array, and _nbmask is a memoryview of it for the search
+    # loops. both are worked out for the whole board the first time
+    @property
+    def nbmask(self):
+        if self._masks is None:
+            self.updateNeighbors()
+        return self._masks[0]
+
+    @property
+    def _nbmask(self):
+        if self._masks is None:
+            self.updateNeighbors()
+        return self._masks[1]
+
+    # state of the last search run on this board by Dijkstra or Astar.
+    # prev holds the cell id of the cell that "discovered" each cell
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = SearchState(self.ncells)
+        return self._state
+
+    # plant trees on (tree=True) or clear trees from a list of [r, c]
+    # locations, fixing up the neighbor masks around them only. returns
+    # the cell ids that actually changed
+    def setTrees(self, locations, tree=True):
+        locations = np.asarray(locations, dtype=np.intp).reshape(-1, 2)
+        cells = np.unique(locations[:, 0] * self.ncols + locations[:, 1])
+        flat = self.obstacles.reshape(-1)
+        cells = cells[flat[cells] != int(tree)]
+        if len(cells) == 0:
+            return cells
+
+        flat[cells] = int(tree)
+        self.fields.clear()
+        self.inflations.clear()
+        self.version += 1
+        self.updateMinWeight()
+        if self._masks is None:
+            # nothing worked out yet, the masks will start from the new trees
+            return cells
+
+        # the changed cells and every cell next to one of them
+        r, c = np.divmod(cells, self.ncols)
+        dr = np.array([0] + [dr for dr, _, _ in OFFSETS])
+        dc = np.array([0] + [dc for _, dc, _ in OFFSETS])
+        r = (r[:, None] + dr).reshape(-1)
+        c = (c[:, None] + dc).reshape(-1)
+        inside = (r >= 0) & (r < self.nrows) & (c >= 0) & (c < self.ncols)
+        around = np.unique(r[inside] * self.ncols + c[inside])
+
+        # same as updateNeighbors, for those cells only
+        r, c = np.divmod(around, self.ncols)
+        nbmask = np.zeros(len(around), dtype=np.uint8)
+        for k, (dr, dc, _) in enumerate(OFFSETS):
+            rr = r + dr
+            cc = c + dc
+            open_ = (rr >= 0) & (rr < self.nrows) & (cc >= 0) & (cc < self.ncols)
+            open_[open_] = self.obstacles[rr[open_], cc[open_]] == 0
+            nbmask |= open_.astype(np.uint8) << k
+        self.nbmask[around] = nbmask
+        return cells
+
+    # hash of the board's size and trees, to tell whether something worked
+    # out for one board (e.g. by HPA.py) still fits another. worked out
+    # once per version of the board
+    def fingerprint(self):
+        if self._fingerprint[0] == self.version:
+            return self._fingerprint[1]
+
+        h = hashlib.sha1(np.array(self.size, dtype=np.int64).tobytes())
+        h.update(self.obstacles.tobytes())
+        if self.weights is not None:
+            h.update(self.weights.tobytes())
+        self._fingerprint = (self.version, h.hexdigest())
+        return self._fingerprint[1]
+
+    # distance from every cell to the nearest tree, as a read-only
+    # (nrows, ncols) float64 raster, see distance_to_trees. worked out
+    # once per version of the board
+    def clearance(self):
+        if self._clearance[0] != self.version:
+            raster = distance_to_trees(self.obstacles)
+            raster.flags.writeable = False
+            self._clearance = (self.version, raster)
+        return self._clearance[1]
+
+    # the board as a robot of a radius sees it: a Grid where every cell
+    # closer than radius to a tree is a tree too, so searches on it keep
+    # the robot clear of them. radius None or 0 is the board itself.
+    # its raster is the mask clearance < radius and it shares this
+    # board's cell costs. its neighbor masks and search state are only
+    # made if something searches it (Planner brings its own state). the
+    # last INFLATIONS radii asked for are kept until the trees change
+    def inflated(self, radius):
+        if radius is None or radius <= 0:
+            return self
+        grid = self.inflations.get(radius)
+        if grid is not None:
+            self.inflations.move_to_end(radius)
+            return grid
+
+        blocked = (self.clearance() < radius).view(np.uint8)
+        grid = Grid(self.size, self.start, self.goal, None, obstacles=blocked)
+        if self.weights is not None:
+            grid.weights = self.weights
+            grid._weights = self._weights
+            grid.updateMinWeight()
+        self.inflations[radius] = grid
+        if len(self.inflations) > INFLATIONS:
+            self.inflations.popitem(last=False)
+        return grid
+
+    # return the cell id of a location
+    def cell(self, r, c):
+        return r * self.ncols + c
+
+    # return the [r, c] location of a cell id
+    def location(self, cell):
+        return [cell // self.ncols, cell % self.ncols]
+
+    # return (cell, distance) for the cells next to a cell that aren't trees.
+    # this builds a new list every call, search loops should look up
+    # moves[_nbmask[cell]] themselves the way Astar.search_grid does
+    def getNeighbors(self, cell):
+        moves = self.moves[self._nbmask[cell]]
+        weights = self._weights
+        if weights is None:
+            return [(cell + delta, dist) for delta, dist in moves]
+        here = weights[cell]
+        return [(cell + delta, dist * (here + weights[cell + delta]) * 0.5) for delta, dist in moves]
+
+    # cost of a move with step cost dist between two cells next to each other
+    def moveCost(self, cell, nb, dist):
+        if self._weights is None:
+            return dist
+        return dist * (self._weights[cell] + self._weights[nb]) * 0.5
+
+    # expand a whole frontier at once. returns arrays of (cell, neighbor,
+    # distance) with one entry for every open move out of every cell
+    def expand(self, cells):
+        cells = np.asarray(cells, dtype=np.intp).reshape(-1)
+        bits = (self.nbmask[cells, None] >> np.arange(8, dtype=np.uint8)) & 1
+        rows, moves = np.nonzero(bits)
+        src = cells[rows]
+        dst = src + self.deltas[moves]
+        dist = self.steps[moves]
+        if self.weights is not None:
+            flat = self.weights.reshape(-1)
+            dist = dist * (flat[src] + flat[dst]) * 0.5
+        return src, dst, dist
+
+    # return the path from start to a location as an (L, 2) array of
+    # [r, c] rows, or an empty array if the search never reached it. by
+    # default this is the board's own start and goal and last search
+    def getPath(self, location=None, state=None, start=None):
+        if location is None:
+            location = self.goal
+        if state is None:
+            state = self.state
+        if start is None:
+            start = self.start
+
+        cells = np.fromiter(state.walkBack(self.cell(*location)), dtype=np.intp)
+        if cells[-1] != self.cell(*start):
+            return np.empty((0, 2), dtype=np.intp)
+
+        # reverse the path
+        cells = cells[::-1]
+        return np.stack(np.divmod(cells, self.ncols), axis=1)
+
+    # Tile objects for the whole board, built from the arrays each time
+    # they are asked for. only meant for printing (see Render.py)
+    @property
+    def tiles(self):
+        cost = self.state.costs().tolist()
+        prev = self.state.prevs().tolist()
+        visited = self.state.visited().tolist()
+        obstacles = self.obstacles.tolist()
+
+        tiles = [[] for _ in range(self.nrows)]
+        for r in range(self.nrows):
+            for c in range(self.ncols):
+                cell = r * self.ncols + c
+                tile = Tile(r, c, _type="*" if obstacles[r][c] else " ")
+                tile.cost = tile.distance = cost[cell]
+                tile.visited = visited[cell]
+                if self.weights is not None:
+                    tile.weight = float(self.weights[r, c])
+                if prev[cell] >= 0:
+                    tile.prev = self.location(prev[cell])
+                tiles[r].append(tile)
+
+        tiles[self.start[0]][self.start[1]].type = "$"
+        tiles[self.goal[0]][self.goal[1]].type = "#"
+        return tiles
@@ -0,0 +1,393 @@
+import sys
+import time
+import heapq
+import numpy as np
+
+from Grid import Grid, SearchState, Result, OFFSETS, random_raster
+import Astar
+import Dijkstra
+import Wavefront
+
+'''
+Hierarchical path planning (HPA*) for huge maps
+
+The board is cut into square clusters. Where two clusters touch, every
+stretch of open border ("entrance") gets one or two transition cells on
+each side, and the distance between every two transition cells of a
+cluster is worked out once inside the cluster (Wavefront.py).
+That gives a small abstract graph:
+
+    nodes   the transition cells
+    edges   one move across a border between the two sides of an
+            entrance, and the distance inside a cluster between its
+            transition cells
+
+A query only searches the start's and the goal's clusters to hook them
+up to the graph, runs A* on the graph and then refines the abstract path
+with A* inside each cluster it goes through. Paths are near-optimal:
+they cross borders at the transition cells only.
+
+Building the graph is the slow part and only depends on the board, so it
+can be saved and loaded again for any Grid with the same trees.
+
+    >>> from HPA import HPA
+    >>> hpa = HPA(grid, cluster_size=16)
+    >>> result = hpa.plan([0, 0], [999, 999])
+    >>> hpa.save("board.hpa.npz")
+    >>> hpa = HPA.load("board.hpa.npz", grid)
+
+HOW TO RUN THIS CODE:
+
+    $ python HPA.py
+'''
+
+# PARAMETERS
+#############
+CLUSTER_SIZE = 16
+ENTRANCE_SPLIT = 6  # entrances at least this wide get a transition at both ends
+#############
+BOARD_SIZE = [512, 512]
+TREE_DENSITY = 0.2
+SEED = 0
+NQUERIES = 20
+#############
+
+
+# the transition cells of every entrance along the borders between
+# clusters of size k. returns arrays (a, b, cost) of cell ids on both
+# sides of each crossing and the cost of the move across
+def _entrances(obstacles, k):
+    nrows, ncols = obstacles.shape
+    free = obstacles == 0
+    a = []
+    b = []
+    costs = []
+
+    # borders between clusters side by side (transposed: one above the
+    # other). an entrance is a run of rows where the cells on both sides
+    # are open, it also ends where a border between clusters crosses it
+    for transpose in (False, True):
+        grid_free = free.T if transpose else free
+        n, m = grid_free.shape
+        for col in range(k, m, k):
+            pairs = grid_free[:, col - 1] & grid_free[:, col]
+            row = 0
+            while row < n:
+                if not pairs[row]:
+                    row += 1
+                    continue
+                end = row + 1
+                while end < n and pairs[end] and end % k != 0:
+                    end += 1
+
+                if end - row < ENTRANCE_SPLIT:
+                    rows = [(row + end - 1) // 2]
+                else:
+                    rows = [row, end - 1]
+                for r in rows:
+                    if transpose:
+                        a.append((col - 1) * ncols + r)
+                        b.append(col * ncols + r)
+                    else:
+                        a.append(r * ncols + col - 1)
+                        b.append(r * ncols + col)
+                    costs.append(1.0)
+                row = end
+
+    # diagonal moves into another cluster where both cells next to the
+    # move are trees. nothing else connects the two sides there
+    for dr in (1, -1):
+        r0, r1 = (0, nrows - 1) if dr == 1 else (1, nrows)
+        rows = np.arange(r0, r1)[:, None]
+        cols = np.arange(ncols - 1)[None, :]
+        move = (free[r0:r1, :-1] & free[r0 + dr:r1 + dr, 1:]
+                & ~free[r0 + dr:r1 + dr, :-1] & ~free[r0:r1, 1:])
+        move &= ((cols + 1) % k == 0) | ((rows + dr) // k != rows // k)
+        rr, cc = np.nonzero(move)
+        rr += r0
+        a.extend((rr * ncols + cc).tolist())
+        b.extend(((rr + dr) * ncols + cc + 1).tolist())
+        costs.extend([OFFSETS[1][2]] * len(rr))
+
+    return np.array(a, dtype=np.int64), np.array(b, dtype=np.int64), np.array(costs)
+
+
+class HPA:
+    def __init__(self, grid, cluster_size=CLUSTER_SIZE, _graph=None):
+        self.grid = grid
+        self.k = cluster_size
+
+        # one SearchState for every search inside a cluster, and the Grid
+        # of the last cluster searched as (cluster, Grid, r0, c0). the
+        # Grids of the others aren't kept, on a huge board they would
+        # take more room than the board
+        self.scratch = SearchState(cluster_size * cluster_size)
+        self.last = None
+
+        # expansions of the last query on the abstract graph
+        self.nits = 0
+
+        if _graph is None:
+            _graph = self.build()
+        self.nodes, self.indptr, self.dst, self.cost = _graph
+
+        # the cell ids of the nodes as a list, for the search
+        self.cells = self.nodes.tolist()
+
+        # node indices of the transition cells of every cluster
+        self.members = {}
+        for i, cell in enumerate(self.nodes.tolist()):
+            self.members.setdefault(self.clusterOf(cell), []).append(i)
+
+    # return the cluster of a cell id as (cluster row, cluster col)
+    def clusterOf(self, cell):
+        r, c = divmod(cell, self.grid.ncols)
+        return r // self.k, c // self.k
+
+    # return (Grid, SearchState, r0, c0) of a cluster, where [r0, c0] is
+    # its top left corner on the board. the Grid is a small board of the
+    # cluster's cells only, made again when another cluster was asked for
+    # in between, and the SearchState is shared by all clusters
+    def getCluster(self, cluster):
+        if self.last is None or self.last[0] != cluster:
+            r0 = cluster[0] * self.k
+            c0 = cluster[1] * self.k
+            raster = self.grid.obstacles[r0:r0 + self.k, c0:c0 + self.k]
+            weights = None
+            if self.grid.weights is not None:
+                weights = self.grid.weights[r0:r0 + self.k, c0:c0 + self.k]
+            sub = Grid(list(raster.shape), [0, 0], [0, 0], None, obstacles=raster, weights=weights)
+            self.last = (cluster, sub, r0, c0)
+        _, sub, r0, c0 = self.last
+        return sub, self.scratch, r0, c0
+
+    # distances from a cell to every cell of its own cluster, without
+    # leaving the cluster, as a flat array over the cluster's cells
+    def clusterDistances(self, cell):
+        sub, state, r0, c0 = self.getCluster(self.clusterOf(cell))
+        r, c = divmod(cell, self.grid.ncols)
+        state.reset()
+        Dijkstra.search_grid(sub, state, [r - r0, c - c0], max_its=float("inf"))
+        return state.costs()
+
+    # cell ids of a list of cells of one cluster, as an array of their
+    # cell ids within the cluster
+    def localCells(self, cluster, cells):
+        sub, _, r0, c0 = self.getCluster(cluster)
+        r, c = np.divmod(np.asarray(cells, dtype=np.int64), self.grid.ncols)
+        return (r - r0) * sub.ncols + (c - c0)
+
+    # work out the abstract graph. returns (nodes, indptr, dst, cost): the
+    # cell id of every node and its edges in compressed sparse row form,
+    # the edges of node i go to dst[indptr[i]:indptr[i+1]]
+    def build(self):
+        a, b, cross = _entrances(self.grid.obstacles, self.k)
+        if self.grid.weights is not None:
+            flat = self.grid.weights.reshape(-1)
+            cross = cross * (flat[a] + flat[b]) * 0.5
+        nodes = np.unique(np.concatenate((a, b)))
+        node_of = {cell: i for i, cell in enumerate(nodes.tolist())}
+
+        # moves across borders go both ways
+        src = [node_of[cell] for cell in a.tolist()] + [node_of[cell] for cell in b.tolist()]
+        dst = src[len(a):] + src[:len(a)]
+        cost = cross.tolist() * 2
+
+        # distances inside every cluster between its transition cells
+        members = {}
+        for cell in nodes.tolist():
+            members.setdefault(self.clusterOf(cell), []).append(cell)
+        # from all of them at once, see Wavefront.distance_fields
+        for cluster, cells in members.items():
+            sub, _, r0, c0 = self.getCluster(cluster)
+            r, c = np.divmod(np.array(cells, dtype=np.int64), self.grid.ncols)
+            fields = Wavefront.distance_fields(sub, np.stack((r - r0, c - c0), axis=1))
+            distance = fields.reshape(len(cells), -1)[:, self.localCells(cluster, cells)]
+            np.fill_diagonal(distance, float("inf"))
+            i, j = np.nonzero(np.isfinite(distance))
+            ids = np.array([node_of[cell] for cell in cells])
+            src.extend(ids[i].tolist())
+            dst.extend(ids[j].tolist())
+            cost.extend(distance[i, j].tolist())
+
+        order = np.argsort(src, kind="stable")
+        indptr = np.searchsorted(np.array(src)[order], np.arange(len(nodes) + 1))
+        return (nodes, indptr, np.array(dst, dtype=np.int64)[order], np.array(cost)[order])
+
+    # write the abstract graph to an .npz file
+    def save(self, path):
+        np.savez_compressed(path, cluster_size=self.k, fingerprint=self.grid.fingerprint(),
+                            nodes=self.nodes, indptr=self.indptr, dst=self.dst, cost=self.cost)
+
+    # read an abstract graph written by save, for a Grid with the same size
+    # and trees as the one it was built for
+    @classmethod
+    def load(cls, path, grid):
+        with np.load(path) as data:
+            if str(data["fingerprint"]) != grid.fingerprint():
+                raise ValueError(f"{path} was built for a different board")
+            graph = (data["nodes"], data["indptr"], data["dst"], data["cost"])
+            return cls(grid, int(data["cluster_size"]), _graph=graph)
+
+    # edges from a cell to the transition cells of its cluster, without
+    # leaving the cluster, as a list of (node, distance). also returns the
+    # cell's distances to every cell of the cluster
+    def hookUp(self, cell):
+        cluster = self.clusterOf(cell)
+        distance = self.clusterDistances(cell)
+        nodes = self.members.get(cluster, [])
+        if not nodes:
+            return [], distance
+
+        local = self.localCells(cluster, self.nodes[nodes])
+        edges = [(i, d) for i, d in zip(nodes, distance[local].tolist()) if d < float("inf")]
+        return edges, distance
+
+    # A* on the abstract graph from start to goal, both cell ids. returns
+    # the list of cells of the abstract path and its cost, or ([], inf)
+    def searchAbstract(self, source, target):
+        ncols = self.grid.ncols
+        goal = divmod(target, ncols)
+        n = len(self.nodes)
+        start_node, goal_node = n, n + 1
+
+        # hook the start and the goal up to the transition cells of their
+        # clusters. a start and goal in the same cluster may also be joined
+        # inside it
+        start_edges, distance = self.hookUp(source)
+        goal_edges = dict(self.hookUp(target)[0])
+        cluster = self.clusterOf(source)
+        if cluster == self.clusterOf(target):
+            d = float(distance[self.localCells(cluster, [target])[0]])
+            if d < float("inf"):
+                start_edges.append((goal_node, d))
+
+        cells = self.cells + [source, target]
+        heuristic = Astar.scaled(Astar.octile, self.grid.min_weight)
+
+        g = {start_node: 0.0}
+        prev = {start_node: -1}
+        closed = set()
+        h = heuristic(*divmod(source, ncols), goal)
+        open_set = [(h, h, start_node)]
+        self.nits = 0
+        while open_set:
+            _, _, node = heapq.heappop(open_set)
+            if node in closed:
+                continue
+            if node == goal_node:
+                break
+            closed.add(node)
+            self.nits += 1
+
+            if node == start_node:
+                edges = start_edges
+            else:
+                # the graph's own edges are only turned into lists for
+                # the nodes the search gets to
+                lo, hi = self.indptr[node], self.indptr[node + 1]
+                edges = list(zip(self.dst[lo:hi].tolist(), self.cost[lo:hi].tolist()))
+                if node in goal_edges:
+                    edges.append((goal_node, goal_edges[node]))
+
+            for nb, d in edges:
+                if nb in closed:
+                    continue
+                if nb not in g or g[node] + d < g[nb]:
+                    g[nb] = g[node] + d
+                    prev[nb] = node
+                    h = heuristic(*divmod(cells[nb], ncols), goal)
+                    heapq.heappush(open_set, (g[nb] + h, h, nb))
+
+        if goal_node not in prev:
+            return [], float("inf")
+
+        path = []
+        node = goal_node
+        while node != -1:
+            path.append(cells[node])
+            node = prev[node]
+        return path[::-1], g[goal_node]
+
+    # turn an abstract path into a path of moves: a step across a border,
+    # or A* inside the cluster both ends are in
+    def refine(self, cells):
+        ncols = self.grid.ncols
+        path = [list(divmod(cells[0], ncols))]
+        for a, b in zip(cells, cells[1:]):
+            if a == b:
+                continue
+            cluster = self.clusterOf(a)
+            if cluster != self.clusterOf(b):
+                path.append(list(divmod(b, ncols)))
+                continue
+
+            sub, state, r0, c0 = self.getCluster(cluster)
+            ra, ca = divmod(a, ncols)
+            rb, cb = divmod(b, ncols)
+            state.reset()
+            Astar.search_grid(sub, state, [ra - r0, ca - c0], [rb - r0, cb - c0], max_its=float("inf"))
+            leg = sub.getPath([rb - r0, cb - c0], state, [ra - r0, ca - c0]) + [r0, c0]
+            path.extend(leg[1:].tolist())
+        return np.array(path, dtype=np.intp)
+
+    # return the Result of a query from start to goal
+    def plan(self, start, goal):
+        for location in (start, goal):
+            if not (0 <= location[0] < self.grid.nrows and 0 <= location[1] < self.grid.ncols):
+                raise ValueError(f"{list(location)} is off the {self.grid.nrows}x{self.grid.ncols} board")
+
+        t = time.perf_counter()
+        source = self.grid.cell(*start)
+        target = self.grid.cell(*goal)
+        self.nits = 0
+
+        # nothing can start or end inside a tree
+        if self.grid.blocked[source] or self.grid.blocked[target]:
+            cells, cost = [], float("inf")
+        else:
+            cells, cost = self.searchAbstract(source, target)
+
+        if cells:
+            path = self.refine(cells)
+            status = "destination reached"
+        else:
+            path = np.empty((0, 2), dtype=np.intp)
+            status = "destination can't be reached"
+
+        return Result(path, cost, self.nits, time.perf_counter() - t, status)
+
+    # answer a list of (start, goal) pairs, in order
+    def plan_many(self, pairs):
+        return [self.plan(start, goal) for start, goal in pairs]
+
+
+def main():
+    start, goal, raster = random_raster(BOARD_SIZE, TREE_DENSITY, SEED)
+    grid = Grid(BOARD_SIZE, start, goal, None, obstacles=raster)
+
+    t = time.perf_counter()
+    hpa = HPA(grid)
+    print(f"abstract graph of a {BOARD_SIZE[0]}x{BOARD_SIZE[1]} board: {len(hpa.nodes)} nodes, "
+          f"{len(hpa.dst)} edges, built in {time.perf_counter() - t:.2f} s")
+
+    # corner to corner and random queries, compared with plain A*
+    rng = np.random.default_rng(SEED)
+    free = np.flatnonzero(raster.reshape(-1) == 0)
+    pairs = [(start, goal)] + [(grid.location(a), grid.location(b))
+                               for a, b in rng.choice(free, (NQUERIES, 2)).tolist()]
+    state = SearchState(grid.ncells)
+    for s, g in pairs:
+        result = hpa.plan(s, g)
+        state.reset()
+        t = time.perf_counter()
+        Astar.search_grid(grid, state, s, g, max_its=float("inf"))
+        astar_time = time.perf_counter() - t
+        optimal = state.getCost(grid.cell(*g))
+        sys.stdout.write(f"{str(s):>12} -> {str(g):<12} cost {result.cost:9.2f} "
+                         f"(optimal {optimal:9.2f}) in {result.time*1e3:7.2f} ms "
+                         f"(A* {astar_time*1e3:7.2f} ms)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import math
+import time
+from collections import OrderedDict
+import numpy as np
+
+from Grid import Grid
+from Planner import Planner
+import Astar
+import Dijkstra
+
+'''
+Cached heuristic tables and landmark (ALT) heuristics
+
+A heuristic is called once for every cell pushed on the open set. When
+many queries go to the same few goals, the heuristic of every cell for
+a goal can be worked out once, as an array, and looked up after that.
+A CachedHeuristic keeps those tables for the goals it was used with
+most recently, keyed by Grid.version and the goal, so planting or
+clearing trees (Grid.setTrees) never leaves a stale table behind.
+
+Landmarks are a tighter heuristic for boards with walls, where the
+straight line distance is much shorter than the way around. Dijkstra
+distance fields from a few landmark cells give, by the triangle
+inequality, the lower bound
+
+    h(v, goal) = max over landmarks L of |d(L, goal) - d(L, v)|
+
+which follows the walls the way straight lines can't. Both are callable
+like the functions in Astar.py, so they work anywhere a heuristic does:
+
+    >>> from Heuristics import CachedHeuristic, Landmarks
+    >>> planner = Planner(grid, heuristic=CachedHeuristic(grid))
+    >>> planner = Planner(grid, heuristic=Landmarks(grid))
+
+tables are float32, rounded down so they never overestimate.
+
+HOW TO RUN THIS CODE:
+
+    $ python Heuristics.py
+'''
+
+# PARAMETERS
+#############
+CACHE_SIZE = 8  # goals to keep tables for
+NLANDMARKS = 8
+#############
+BOARD_SIZE = [256, 256]
+WALL_SPACING = 16  # rows between the walls of the board in main()
+SEED = 0
+NQUERIES = 20
+#############
+
+
+# round an array of float64 values down to float32
+def _round_down(values):
+    table = values.astype(np.float32)
+    too_big = table > values
+    table[too_big] = np.nextafter(table[too_big], np.float32(0))
+    return table
+
+
+# the values of a heuristic at every cell of a Grid for one goal, as a
+# float64 (nrows, ncols) array. the heuristics of Astar.py are worked
+# out for the whole board at once, any other one cell by cell
+def evaluate(grid, heuristic, goal):
+    if heuristic is Astar.zero:
+        return np.zeros((grid.nrows, grid.ncols))
+
+    dr = np.abs(np.arange(grid.nrows, dtype=np.float64) - goal[0])[:, None]
+    dc = np.abs(np.arange(grid.ncols, dtype=np.float64) - goal[1])[None, :]
+    if heuristic is Astar.octile:
+        return np.maximum(dr, dc) + (math.sqrt(2.0) - 1.0) * np.minimum(dr, dc)
+    if heuristic is Astar.euclidean:
+        return np.sqrt(dr**2 + dc**2)
+
+    return np.array([[heuristic(r, c, goal) for c in range(grid.ncols)]
+                     for r in range(grid.nrows)], dtype=np.float64)
+
+
+class CachedHeuristic:
+    # tables already account for the cell costs, see Astar.scaled
+    weighted = True
+
+    def __init__(self, grid, heuristic=Astar.octile, maxsize=CACHE_SIZE):
+        self.grid = grid
+        self.heuristic = heuristic
+        self.maxsize = maxsize
+
+        # (version, goal) -> flat table, least recently used first
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # the table the last call looked in and the (r, c) goal it is for.
+        # views holds the tables of this version of the board by goal, for
+        # searches that go back and forth between two goals (Bidirectional.py)
+        self._goal = (None, None)
+        self._version = None
+        self._table = None
+        self._views = {}
+
+    # the table of a goal for the current version of the board, as a
+    # read-only (nrows, ncols) float32 array
+    def table(self, goal):
+        key = (self.grid.version, int(goal[0]), int(goal[1]))
+        if key in self.tables:
+            self.tables.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            table = _round_down(self.build(goal)).reshape(-1)
+            table.flags.writeable = False
+            self.tables[key] = table
+            if len(self.tables) > self.maxsize:
+                self.tables.popitem(last=False)
+        return self.tables[key].reshape(self.grid.nrows, self.grid.ncols)
+
+    # work out the float64 (nrows, ncols) table of a goal
+    def build(self, goal):
+        return evaluate(self.grid, self.heuristic, goal) * self.grid.min_weight
+
+    # called like the heuristics of Astar.py, for every cell pushed. a
+    # search passes the same goal every time, so after the first call
+    # this is a comparison of the goal and one lookup
+    def __call__(self, r, c, goal):
+        last = self._goal
+        if goal[0] != last[0] or goal[1] != last[1] or self.grid.version != self._version:
+            self.switch(goal)
+        return self._table[r * self.grid.ncols + c]
+
+    # look in the table of another goal, or of a new version of the board
+    def switch(self, goal):
+        if self.grid.version != self._version:
+            self._version = self.grid.version
+            self._views.clear()
+        key = (int(goal[0]), int(goal[1]))
+        view = self._views.get(key)
+        if view is None:
+            if len(self._views) >= self.maxsize:
+                self._views.clear()
+            view = self._views[key] = memoryview(self.table(goal).reshape(-1))
+        self._goal = key
+        self._table = view
+
+
+class Landmarks(CachedHeuristic):
+    def __init__(self, grid, nlandmarks=NLANDMARKS, maxsize=CACHE_SIZE, seed=SEED):
+        super().__init__(grid, Astar.octile, maxsize)
+        self.nlandmarks = nlandmarks
+        self.seed = seed
+
+        # [r, c] of every landmark and its distance field, as rows of an
+        # (nlandmarks, ncells) array. worked out when first needed and
+        # again after the trees change
+        self.landmarks = []
+        self.distances = None
+        self.fields_version = None
+
+    # pick landmarks far apart: a random cell first, then each time the
+    # cell farthest from the landmarks so far. cells behind walls are
+    # where the bound helps most, and far landmarks reach around them
+    def place(self):
+        rng = np.random.default_rng(self.seed)
+        free = np.flatnonzero(self.grid.obstacles.reshape(-1) == 0)
+        self.landmarks = []
+        fields = []
+        if len(free):
+            nearest = np.full(self.grid.ncells, float("inf"))
+            cell = int(rng.choice(free))
+            for _ in range(self.nlandmarks):
+                self.landmarks.append(self.grid.location(cell))
+                distance, _ = Dijkstra.distance_field(self.grid, self.landmarks[-1])
+                distance = distance.reshape(-1)
+                fields.append(distance)
+
+                # the next landmark is the reachable cell farthest from
+                # all of them, or a cell in a part not reached yet
+                nearest = np.minimum(nearest, distance)
+                unreached = free[np.isinf(nearest[free])]
+                if len(unreached):
+                    cell = int(rng.choice(unreached))
+                else:
+                    cell = int(free[np.argmax(nearest[free])])
+
+        self.distances = np.array(fields).reshape(len(fields), self.grid.ncells)
+        self.fields_version = self.grid.version
+
+    def build(self, goal):
+        if self.fields_version != self.grid.version:
+            self.place()
+
+        bound = super().build(goal).reshape(-1)
+        goal_distance = self.distances[:, self.grid.cell(*goal)][:, None]
+        with np.errstate(invalid="ignore"):
+            # cells a landmark reaches and the goal doesn't (or the other
+            # way around) can't reach the goal at all. a landmark that
+            # reaches neither tells nothing
+            gap = np.abs(goal_distance - self.distances)
+            gap[np.isnan(gap)] = 0.0
+        if len(gap):
+            bound = np.maximum(bound, gap.max(axis=0))
+        return bound.reshape(self.grid.nrows, self.grid.ncols)
+
+
+# a board of walls across every WALL_SPACING rows, each with one gap at
+# a random column, so the way to the goal zigzags across the board
+def wall_board(size, spacing, seed):
+    rng = np.random.default_rng(seed)
+    raster = np.zeros(size, dtype=np.uint8)
+    for r in range(spacing, size[0], spacing):
+        raster[r, :] = 1
+        gap = rng.integers(0, size[1] - 2)
+        raster[r, gap:gap + 2] = 0
+    return [0, 0], [size[0] - 1, size[1] - 1], raster
+
+
+def main():
+    start, goal, raster = wall_board(BOARD_SIZE, WALL_SPACING, SEED)
+    grid = Grid(BOARD_SIZE, start, goal, None, obstacles=raster)
+
+    # a few popular goals, many starts
+    rng = np.random.default_rng(SEED)
+    free = np.argwhere(raster == 0).tolist()
+    goals = [free[i] for i in rng.integers(0, len(free), 3)]
+    queries = [(free[i], goals[k % len(goals)])
+               for k, i in enumerate(rng.integers(0, len(free), NQUERIES))]
+
+    t = time.perf_counter()
+    landmarks = Landmarks(grid)
+    landmarks.place()
+    print(f"{landmarks.nlandmarks} landmarks placed in {time.perf_counter() - t:.2f} s")
+
+    for name, heuristic in (("octile", Astar.octile),
+                            ("cached octile", CachedHeuristic(grid)),
+                            ("landmarks", landmarks)):
+        planner = Planner(grid, heuristic=heuristic, max_its=float("inf"))
+        t = time.perf_counter()
+        results = planner.plan_many(queries)
+        expansions = sum(result.expansions for result in results)
+        cost = sum(result.cost for result in results)
+        print(f"{name:14} {expansions:8} expansions in {time.perf_counter() - t:.2f} s, "
+              f"total cost {cost:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import time
+import heapq
+import numpy as np
+
+from Grid import Grid, Result, Stats, OFFSETS
+import Astar
+import Render
+
+'''
+Jump Point Search
+
+A* for the uniform-cost 8-connected boards of Astar.py and Dijkstra.py
+that skips the many paths of equal cost open areas are full of. Instead
+of pushing every neighbor it scans ("jumps") in a straight or diagonal
+line until it hits a cell with a forced neighbor (a tree next to it
+opens up a way that doesn't go through the cell it came from), or the
+goal. Only those jump points go on the open list. Paths cost the same
+as the ones Astar finds. Jumps only skip cells because every cell costs
+the same, so Grids with weights are left to the other planners.
+
+    >>> from JPS import JPS
+    >>> result = JPS(Grid([100, 100], [0, 0], [99, 99], trees)).run()
+
+or from a Planner with algorithm="jps". the search runs on a Grid, a
+Board is converted first
+
+HOW TO RUN THIS CODE:
+
+    $ python JPS.py
+'''
+
+# PARAMETERS
+#############
+MAX_ITS = 1e4  # jump points expanded before giving up
+#############
+
+# move k (an index into OFFSETS) from (sign of dr, sign of dc)
+DIRECTION = {(dr, dc): k for k, (dr, dc, _) in enumerate(OFFSETS)}
+
+
+def _bit(mask, k):
+    return mask >> (k & 7) & 1
+
+
+# FORCED[k][mask] tells whether a cell with open moves mask, reached by a
+# move in direction k, has a forced neighbor. trees right next to the
+# cell that a straight move goes past, or that a diagonal move cuts by,
+# make the moves around them only reachable through this cell
+FORCED = []
+# SUCCESSORS[k][mask] lists the directions to jump in from a cell reached
+# by a move in direction k: the natural ones (straight on, plus both
+# straight parts of a diagonal) and the forced ones. the start cell has no
+# parent and jumps in every open direction, that's SUCCESSORS[8]
+SUCCESSORS = []
+for k in range(8):
+    forced_k = []
+    successors_k = []
+    for mask in range(256):
+        if k % 2 == 0:
+            natural = [k]
+            forced = [k + s for s in (1, -1) if not _bit(mask, k + 2*s)]
+        else:
+            natural = [k, k - 1, k + 1]
+            forced = [k + 2*s for s in (1, -1) if not _bit(mask, k + 3*s)]
+        forced_k.append(any(_bit(mask, d) for d in forced))
+        successors_k.append(tuple(d & 7 for d in natural + forced if _bit(mask, d)))
+    FORCED.append(forced_k)
+    SUCCESSORS.append(successors_k)
+SUCCESSORS.append([tuple(k for k in range(8) if _bit(mask, k)) for mask in range(256)])
+
+
+# walk from cell in straight direction k until the next jump point.
+# returns its cell id, or -1 if a tree or the edge of the board comes first
+def _jump_straight(cell, k, target, nbmask, delta):
+    forced = FORCED[k]
+    mask = nbmask[cell]
+    while mask >> k & 1:
+        cell += delta
+        if cell == target:
+            return cell
+        mask = nbmask[cell]
+        if forced[mask]:
+            return cell
+    return -1
+
+
+# walk from cell in diagonal direction k until the next jump point, which
+# is also any cell a straight jump out of finds one from
+def _jump(cell, k, target, nbmask, deltas):
+    if k % 2 == 0:
+        return _jump_straight(cell, k, target, nbmask, deltas[k])
+
+    forced = FORCED[k]
+    delta = deltas[k]
+    k1 = k - 1
+    k2 = (k + 1) & 7
+    delta1 = deltas[k1]
+    delta2 = deltas[k2]
+    mask = nbmask[cell]
+    while mask >> k & 1:
+        cell += delta
+        if cell == target:
+            return cell
+        mask = nbmask[cell]
+        if forced[mask]:
+            return cell
+        if (_jump_straight(cell, k1, target, nbmask, delta1) != -1
+                or _jump_straight(cell, k2, target, nbmask, delta2) != -1):
+            return cell
+    return -1
+
+
+# jump point search from start to goal on a Grid, writing g-costs and
+# prev links into a freshly reset SearchState like Astar.search_grid.
+# prev links go from jump point to jump point, see fill_path. returns
+# whether the goal was reached within max_its expansions (MAX_ITS by
+# default) and how many jump points were expanded. pass a Stats to have
+# its counters filled in, evaluations counts the directions jumped in
+def search_grid(grid, state, start, goal, heuristic=Astar.octile, max_its=None, stats=None):
+    if max_its is None:
+        max_its = MAX_ITS
+    if grid.weights is not None:
+        raise ValueError("jump point search needs a Grid without weights")
+
+    epoch = state.epoch
+    cost = memoryview(state.cost)
+    prev = memoryview(state.prev)
+    stamp = memoryview(state.stamp)
+    closed = memoryview(state.closed)
+    ncols = grid.ncols
+    nbmask = memoryview(grid.nbmask)
+    deltas = [int(delta) for delta in grid.deltas]
+    steps = [float(step) for step in grid.steps]
+    nits = 0
+    nstale = 0
+    nevaluations = 0
+    found = False
+
+    # open set of (f, h, cell), cost holds g and closed is the closed set
+    source = grid.cell(*start)
+    target = grid.cell(*goal)
+    cost[source] = 0.0
+    prev[source] = -1
+    stamp[source] = epoch
+    h = heuristic(start[0], start[1], goal)
+    open_set = [(h, h, source)]
+
+    while open_set:
+        _, _, cell = heapq.heappop(open_set)
+        if closed[cell] == epoch:
+            nstale += 1
+            continue
+
+        # stop if we've reached the destination
+        if cell == target:
+            found = True
+            break
+
+        # the direction we came in from decides where to jump next
+        if prev[cell] == -1:
+            k = 8
+        else:
+            r, c = divmod(cell, ncols)
+            pr, pc = divmod(prev[cell], ncols)
+            k = DIRECTION[((r > pr) - (r < pr), (c > pc) - (c < pc))]
+
+        g = cost[cell]
+        directions = SUCCESSORS[k][nbmask[cell]]
+        nevaluations += len(directions)
+        for d in directions:
+            nb = _jump(cell, d, target, nbmask, deltas)
+            if nb == -1 or closed[nb] == epoch:
+                continue
+
+            # jumps are straight or diagonal lines, so their cost is the
+            # number of steps times the cost of a step
+            nb_cost = g + (nb - cell) // deltas[d] * steps[d]
+            if stamp[nb] != epoch or nb_cost < cost[nb]:
+                cost[nb] = nb_cost
+                stamp[nb] = epoch
+
+                # keep track of shortest path
+                prev[nb] = cell
+
+                r, c = divmod(nb, ncols)
+                h = heuristic(r, c, goal)
+                heapq.heappush(open_set, (nb_cost + h, h, nb))
+
+        closed[cell] = epoch
+
+        nits += 1
+        if nits > max_its:
+            break
+
+    if stats is not None:
+        stats.countSearch(grid, state, nits, nstale, found, len(open_set))
+        stats.evaluations = nevaluations
+
+    return found, nits
+
+
+# fill in the cells between the jump points of a path, an (L, 2) array
+# of [r, c] rows, so it steps from cell to cell like the other planners'
+def fill_path(points):
+    if len(points) < 2:
+        return points
+
+    moves = np.diff(points, axis=0)
+    nsteps = np.abs(moves).max(axis=1)
+    leg = np.repeat(np.arange(len(moves)), nsteps)
+    step = np.arange(nsteps.sum()) - np.repeat(np.cumsum(nsteps) - nsteps, nsteps)
+    cells = points[:-1][leg] + np.sign(moves)[leg] * step[:, None]
+    return np.concatenate((cells, points[-1:]))
+
+
+class JPS:
+    def __init__(self, _board, heuristic=Astar.octile):
+        self.nits = 0
+        self.found = False
+
+        # why the search stopped
+        self.status = None
+
+        # function of (r, c, goal) that never overestimates the remaining cost
+        self.heuristic = heuristic
+
+        # shallow copy the board, and make a Grid to search on if need be
+        self.board = _board
+        self.grid = Grid.from_board(_board)
+
+    # run jump point search and return a Result. on_iteration isn't used,
+    # there is no step by step view of the jumps. with stats=True the
+    # Result carries the Stats of the search
+    def run(self, on_iteration=None, stats=False):
+        stats = Stats("jps") if stats else None
+        grid = self.grid
+
+        t = time.perf_counter()
+        grid.state.reset()
+        self.found, self.nits = search_grid(grid, grid.state, grid.start, grid.goal,
+                                            self.heuristic, stats=stats)
+        if self.found:
+            self.status = "destination reached"
+        elif self.nits > MAX_ITS:
+            self.status = "couldn't reach destination in {} iterations".format(MAX_ITS)
+        else:
+            self.status = "destination can't be reached"
+        t_search = time.perf_counter()
+
+        path = self.recover_path()
+        if self.found:
+            cost = grid.state.getCost(grid.cell(*grid.goal))
+        else:
+            cost = float("inf")
+        t_end = time.perf_counter()
+
+        if stats is not None:
+            stats.phases["construction"] = self.board.build_time
+            stats.phases["search"] = t_search - t
+            stats.phases["recover_path"] = t_end - t_search
+            stats.export()
+
+        return Result(path, cost, self.nits, t_end - t, self.status, stats)
+
+    # return the path from the start to the goal as an (L, 2) array of
+    # [r, c] rows, or an empty array if the goal wasn't reached
+    def recover_path(self):
+        if not self.found:
+            return np.empty((0, 2), dtype=np.intp)
+        return fill_path(self.grid.getPath())
+
+
+def main():
+    # the same board as Astar.py
+    b = Astar.Board(Astar.BOARD_SIZE, Astar.START, Astar.GOAL, Astar.TREES)
+
+    # run jump point search on that board
+    Render.show("jump point search", b, JPS(b))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import sys
+import time
+import numpy as np
+
+from Grid import Grid, random_raster
+
+'''
+Map files
+
+Building a board from a list of trees loops over every tree in Python,
+and a Board of Tile objects touches every cell on top of that, which on
+big site maps takes longer than planning. A map file is a fixed size
+header followed by the obstacle raster:
+
+    offset  type      field
+         0  8 bytes   MAGIC
+         8  uint32    FORMAT_VERSION
+        12  uint32    flags, FLAG_PACKED if the raster is bit-packed
+        16  uint32    nrows
+        20  uint32    ncols
+        24  int32     start r, start c
+        32  int32     goal r, goal c
+        40  ...       zero padding up to HEADER_SIZE
+        64  uint8     raster, row by row, 1=TREE
+
+An unpacked raster is np.memmap-ed straight into a Grid, so loading a
+map reads the header and nothing else. The Grid works out its neighbor
+masks and search state when the first search asks for them, in one
+vectorized pass over the whole board, so that search pays for reading
+the raster once. A packed raster (np.packbits, 8 cells a byte) is an eighth
+of the size on disk but has to be unpacked into memory.
+
+Plain text maps use the symbols of Tile.type, " "=EMPTY, *=TREE,
+$=START, #=GOAL, one line per row. Short lines are padded with empty
+cells.
+
+    >>> import MapFile
+    >>> MapFile.save_map("site.map", raster, start, goal)
+    >>> grid = MapFile.load_grid("site.map")
+    >>> grid = MapFile.load_grid("site.txt")   # plain text works too
+
+HOW TO RUN THIS CODE:
+
+    $ python MapFile.py                             # timings on a random board
+    $ python MapFile.py convert site.txt site.map   # text to binary
+'''
+
+# PARAMETERS
+#############
+BOARD_SIZE = [4096, 4096]  # board main() writes and reads back
+TREE_DENSITY = 0.2
+SEED = 0
+#############
+
+MAGIC = b"PATHMAP\x1a"
+FORMAT_VERSION = 1
+FLAG_PACKED = 1
+HEADER_SIZE = 64
+HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("flags", "<u4"),
+                   ("nrows", "<u4"), ("ncols", "<u4"),
+                   ("start", "<i4", 2), ("goal", "<i4", 2)])
+
+# byte value of each Tile.type symbol
+EMPTY, TREE, START, GOAL = (ord(symbol) for symbol in " *$#")
+
+
+# write a uint8 obstacle raster (1=TREE) and the start and goal to a map
+# file. packed=True stores 8 cells a byte, but can't be memory-mapped
+def save_map(path, obstacles, start, goal, packed=False):
+    obstacles = np.asarray(obstacles, dtype=np.uint8)
+    header = np.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["version"] = FORMAT_VERSION
+    header["flags"] = FLAG_PACKED if packed else 0
+    header["nrows"], header["ncols"] = obstacles.shape
+    header["start"] = start
+    header["goal"] = goal
+
+    with open(path, "wb") as f:
+        f.write(header.tobytes().ljust(HEADER_SIZE, b"\0"))
+        if packed:
+            f.write(np.packbits(obstacles != 0).tobytes())
+        else:
+            f.write(np.ascontiguousarray(obstacles != 0, dtype=np.uint8).tobytes())
+
+
+# read the header of a map file and return (size, start, goal, packed)
+def read_header(path):
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if len(header) == 0 or header["magic"][0] != MAGIC:
+        raise ValueError("{} is not a map file".format(path))
+    if header["version"][0] != FORMAT_VERSION:
+        raise ValueError("{} is map format version {}, expected {}".format(
+            path, header["version"][0], FORMAT_VERSION))
+
+    size = [int(header["nrows"][0]), int(header["ncols"][0])]
+    start = header["start"][0].tolist()
+    goal = header["goal"][0].tolist()
+    return size, start, goal, bool(header["flags"][0] & FLAG_PACKED)
+
+
+# read a map file and return (start, goal, raster). an unpacked raster is
+# memory-mapped, by default copy-on-write so that planting trees on the
+# board (Grid.setTrees) never writes back to the file. pass mode="r+" to
+# have it do that, or mode="r" for a read-only raster
+def load_map(path, mode="c"):
+    size, start, goal, packed = read_header(path)
+    if packed:
+        ncells = size[0] * size[1]
+        bits = np.fromfile(path, dtype=np.uint8, count=(ncells + 7) // 8, offset=HEADER_SIZE)
+        raster = np.unpackbits(bits, count=ncells).reshape(size)
+    else:
+        raster = np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER_SIZE, shape=tuple(size))
+    return start, goal, raster
+
+
+# parse a plain text map (a string) into (start, goal, raster)
+def parse_ascii(text):
+    lines = text.splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    ncols = max((len(line) for line in lines), default=0)
+    chars = np.frombuffer("".join(line.ljust(ncols) for line in lines).encode("ascii"),
+                          dtype=np.uint8).reshape(len(lines), ncols)
+
+    unknown = ~np.isin(chars, [EMPTY, TREE, START, GOAL])
+    if unknown.any():
+        r, c = np.argwhere(unknown)[0].tolist()
+        raise ValueError("unknown symbol {!r} at [{}, {}]".format(chr(chars[r, c]), r, c))
+
+    locations = []
+    for symbol, name in ((START, "start"), (GOAL, "goal")):
+        found = np.argwhere(chars == symbol)
+        if len(found) != 1:
+            raise ValueError("expected one {} ({!r}), found {}".format(name, chr(symbol), len(found)))
+        locations.append(found[0].tolist())
+
+    return locations[0], locations[1], (chars == TREE).astype(np.uint8)
+
+
+# read a plain text map file into (start, goal, raster)
+def read_ascii(path):
+    with open(path) as f:
+        return parse_ascii(f.read())
+
+
+# write a raster, start and goal as a plain text map file
+def write_ascii(path, obstacles, start, goal):
+    chars = np.where(np.asarray(obstacles) != 0, TREE, EMPTY).astype(np.uint8)
+    chars[start[0], start[1]] = START
+    chars[goal[0], goal[1]] = GOAL
+    with open(path, "w") as f:
+        for row in chars:
+            f.write(row.tobytes().decode("ascii") + "\n")
+
+
+# build a Grid from a map file, binary or plain text (anything that
+# doesn't start with MAGIC). the Grid searches right on the memory-mapped
+# raster of an unpacked file, nothing is copied
+def load_grid(path, mode="c"):
+    with open(path, "rb") as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    if binary:
+        start, goal, raster = load_map(path, mode)
+    else:
+        start, goal, raster = read_ascii(path)
+    return Grid(list(raster.shape), start, goal, None, obstacles=raster)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        start, goal, raster = read_ascii(sys.argv[2])
+        save_map(sys.argv[3], raster, start, goal)
+        return
+
+    # write a random board both ways, then time building a Grid from the
+    # list of trees against loading the map file
+    start, goal, raster = random_raster(BOARD_SIZE, TREE_DENSITY, SEED)
+    trees = np.argwhere(raster).tolist()
+    path = "random.map"
+    save_map(path, raster, start, goal)
+    save_map("random.packed.map", raster, start, goal, packed=True)
+
+    t = time.perf_counter()
+    Grid(BOARD_SIZE, start, goal, trees)
+    print(f"Grid from a list of {len(trees)} trees: {time.perf_counter() - t:.2f} s")
+
+    t = time.perf_counter()
+    load_map(path)
+    print(f"memory-mapped raster: {(time.perf_counter() - t)*1e3:.2f} ms")
+
+    t = time.perf_counter()
+    load_map("random.packed.map")
+    print(f"packed raster: {(time.perf_counter() - t)*1e3:.2f} ms")
+
+    t = time.perf_counter()
+    grid = load_grid(path)
+    print(f"Grid from the map file: {(time.perf_counter() - t)*1e3:.2f} ms")
+    assert np.array_equal(grid.obstacles, raster)
+
+    t = time.perf_counter()
+    grid.nbmask
+    print(f"neighbor masks, on the first search: {time.perf_counter() - t:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
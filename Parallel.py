@@ -0,0 +1,165 @@
+import os
+import time
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from Grid import Grid, random_board
+from Planner import Planner
+import Astar
+
+'''
+Parallel runner for big batches of boards and queries
+
+Spreads the work over a pool of worker processes. Obstacle rasters (and
+the cell costs of a weighted Grid) are copied once into shared memory
+and every worker builds its Grids from that memory, so boards are never
+pickled. Results come back in
+the same order as the input, whichever worker ran them.
+
+    >>> from Parallel import run_queries, run_boards
+    >>> results = run_queries(grid, pairs, chunksize=64)
+    >>> results = run_boards([(size, start, goal, trees), ...])
+
+HOW TO RUN THIS CODE:
+
+    $ python Parallel.py
+'''
+
+# PARAMETERS
+#############
+WORKERS = None  # None is one worker per core
+CHUNK_SIZE = 64  # queries or boards handed to a worker at a time
+#############
+NBOARDS = 2000
+TREE_DENSITY = 0.3
+SEED = 0
+#############
+
+# set up in every worker by the pool initializers
+_shm = None
+_rasters = None
+_weights_shm = None
+_planner = None
+_algorithm = None
+_heuristic = None
+_max_its = None
+
+
+# copy an array (uint8 unless it says otherwise) into a new block of
+# shared memory
+def share(data):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+    return shm
+
+
+def _attach(name, nbytes):
+    global _shm, _rasters
+    _shm = shared_memory.SharedMemory(name=name)
+    _rasters = np.ndarray(nbytes, dtype=np.uint8, buffer=_shm.buf)
+
+
+# weights is the name of the shared block of cell costs, None when every
+# cell costs 1. max_its is the expansions allowed per query
+def _init_queries(name, size, algorithm, heuristic, weights=None, max_its=None):
+    global _planner, _weights_shm
+    _attach(name, size[0]*size[1])
+    if weights is not None:
+        _weights_shm = shared_memory.SharedMemory(name=weights)
+        weights = np.ndarray(size, dtype=np.float64, buffer=_weights_shm.buf)
+    grid = Grid(size, [0, 0], [0, 0], None, obstacles=_rasters, weights=weights)
+    _planner = Planner(grid, algorithm, heuristic, max_its)
+
+
+def _plan_query(pair):
+    return _planner.plan(pair[0], pair[1])
+
+
+def _init_boards(name, nbytes, algorithm, heuristic, max_its=None):
+    global _algorithm, _heuristic, _max_its
+    _attach(name, nbytes)
+    _algorithm = algorithm
+    _heuristic = heuristic
+    _max_its = max_its
+
+
+def _plan_board(task):
+    offset, size, start, goal = task
+    raster = _rasters[offset:offset + size[0]*size[1]]
+    grid = Grid(size, start, goal, None, obstacles=raster)
+    return Planner(grid, _algorithm, _heuristic, _max_its).plan(start, goal)
+
+
+# answer (start, goal) pairs on one Grid with a pool of processes. returns
+# the same Results as Planner.plan_many of a Planner with the same
+# algorithm, heuristic and max_its, in the same order
+def run_queries(grid, pairs, algorithm="astar", heuristic=Astar.octile, max_its=None,
+                workers=WORKERS, chunksize=CHUNK_SIZE):
+    shm = share(grid.obstacles)
+    weights = None if grid.weights is None else share(grid.weights)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_queries,
+                                 initargs=(shm.name, grid.size, algorithm, heuristic,
+                                           None if weights is None else weights.name,
+                                           max_its)) as pool:
+            return list(pool.map(_plan_query, pairs, chunksize=chunksize))
+    finally:
+        for block in (shm, weights):
+            if block is not None:
+                block.close()
+                block.unlink()
+
+
+# plan from start to goal on every board in a list of (size, start, goal,
+# trees), the same arguments Board and Grid take, with max_its expansions
+# allowed per board. returns one Result per board, in order
+def run_boards(boards, algorithm="astar", heuristic=Astar.octile, max_its=None,
+               workers=WORKERS, chunksize=CHUNK_SIZE):
+    # lay the boards' rasters out back to back
+    ncells = [size[0]*size[1] for size, _, _, _ in boards]
+    offsets = np.concatenate(([0], np.cumsum(ncells))).astype(int).tolist()
+    rasters = np.zeros(offsets[-1], dtype=np.uint8)
+    for (size, _, _, trees), offset in zip(boards, offsets):
+        trees = np.asarray(trees, dtype=np.intp).reshape(-1, 2)
+        rasters[offset + trees[:, 0]*size[1] + trees[:, 1]] = 1
+
+    tasks = [(offset, size, start, goal)
+             for (size, start, goal, _), offset in zip(boards, offsets)]
+
+    shm = share(rasters)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_boards,
+                                 initargs=(shm.name, rasters.nbytes, algorithm, heuristic,
+                                           max_its)) as pool:
+            return list(pool.map(_plan_board, tasks, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def main():
+    # random boards like the ones in Astar.main
+    rng = random.Random(SEED)
+    boards = []
+    for _ in range(NBOARDS):
+        size = [rng.randint(15, 20) for _ in range(2)]
+        start, goal, trees = random_board(size, TREE_DENSITY, rng.random())
+        boards.append((size, start, goal, trees))
+
+    workers = WORKERS or os.cpu_count()
+    timings = {}
+    results = {}
+    for nworkers in sorted({1, workers}):
+        t = time.perf_counter()
+        results[nworkers] = run_boards(boards, workers=nworkers)
+        timings[nworkers] = time.perf_counter() - t
+        print(f"{nworkers:3d} workers: {NBOARDS / timings[nworkers]:8.1f} boards/s")
+
+    costs = [[r.cost for r in result] for result in results.values()]
+    print("same results for every worker count:", all(c == costs[0] for c in costs))
+
+
+if __name__ == "__main__":
+    main()
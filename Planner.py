@@ -0,0 +1,286 @@
+import time
+from collections import OrderedDict
+import numpy as np
+
+from Grid import Grid, SearchState, Result, Stats
+import Astar
+import Dijkstra
+import JPS
+import Bidirectional
+
+'''
+Reusable planner for answering many queries on one map
+
+Dijkstra and Astar leave their search state on the board they were
+given, so every query needs a fresh board. A Planner is bound to one
+Grid that it never changes and keeps the search state in its own
+SearchState (reset in O(1) between queries).
+
+    >>> from Grid import Grid
+    >>> from Planner import Planner, plan
+    >>> planner = Planner(Grid([100, 100], [0, 0], [99, 99], trees))
+    >>> result = planner.plan([0, 0], [99, 99])
+    >>> result.path, result.cost, result.expansions, result.time
+    >>> results = planner.plan_many([([0, 0], [99, 99]), ([5, 5], [50, 7])])
+
+with stats=True every Result also carries the Stats of its search
+(counters and phase timers), which are handed to the hooks registered
+with Grid.add_stats_hook as well:
+
+    >>> planner = Planner(grid, stats=True)
+    >>> planner.plan([0, 0], [99, 99]).stats.as_dict()
+
+queries that repeat on a board that hasn't changed can be answered from
+a PathCache instead of searching again. it is keyed by the board's
+fingerprint, so planting or clearing trees (Grid.setTrees) makes the old
+answers miss, and they are dropped on the next query. one PathCache can
+be shared by many Planners:
+
+    >>> planner = Planner(grid, cache=True)
+    >>> planner = Planner(grid, cache=PathCache(maxsize=100))
+    >>> planner.cache.hits, planner.cache.misses
+
+a robot with a footprint is kept radius cells clear of the trees, for
+every query or per query. every radius is planned on the board's own
+clearance raster (see Grid.inflated), worked out once:
+
+    >>> planner = Planner(grid, radius=1.5)
+    >>> planner.plan([0, 0], [99, 99], radius=3.0)
+
+for a one-off query on any board there is plan(), which never prints:
+
+    >>> result = plan(board, [0, 0], [10, 10])
+'''
+
+ALGORITHMS = ("astar", "dijkstra", "jps", "biastar", "bidijkstra")
+CACHE_SIZE = 1024  # Results a PathCache keeps by default
+
+
+class PathCache:
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+
+        # key -> Result, least recently used first. keys are
+        # (fingerprint, start, goal, algorithm, heuristic, max_its, radius)
+        self.results = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    # the Result cached for a key, or None
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.results.move_to_end(key)
+            self.hits += 1
+        return result
+
+    # cache a Result, dropping the least recently used one if full. its
+    # path is made read-only, since every hit hands out the same array
+    def put(self, key, result):
+        result.path.flags.writeable = False
+        self.results[key] = result
+        self.results.move_to_end(key)
+        while len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    # drop the Results of the board with a fingerprint, or all of them
+    def invalidate(self, fingerprint=None):
+        if fingerprint is None:
+            self.results.clear()
+            return
+        for key in [key for key in self.results if key[0] == fingerprint]:
+            del self.results[key]
+
+
+class Planner:
+    def __init__(self, grid, algorithm="astar", heuristic=Astar.octile, max_its=None, stats=False,
+                 cache=None, radius=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"unknown algorithm {algorithm!r}, expected one of {ALGORITHMS}")
+
+        self.grid = grid
+        self.algorithm = algorithm
+        self.heuristic = heuristic
+        self.state = SearchState(grid.ncells)
+
+        # the backward search of the bidirectional algorithms has its own
+        self.back = SearchState(grid.ncells) if algorithm in ("biastar", "bidijkstra") else None
+
+        # expansions allowed per query, the algorithm's MAX_ITS by default
+        self.max_its = max_its
+
+        # whether to instrument every query, see Stats
+        self.stats = stats
+
+        # cells expanded by the last query
+        self.nits = 0
+
+        # start and Result of the last plan_iter, see there
+        self.start = None
+        self.result = None
+
+        # PathCache to answer repeated queries from, cache=True for one of
+        # this Planner's own. fingerprint is the board's as of the last query
+        if cache is True:
+            cache = PathCache()
+        self.cache = None if cache is False else cache
+        self.fingerprint = None
+
+        # radius of the robot, searches keep it that far from the trees
+        # (see Grid.inflated). each query can ask for another one
+        self.radius = radius
+
+    # return the Result of a search from start to goal for a robot of a
+    # radius, this Planner's radius by default. its path is an (L, 2)
+    # array of [r, c] rows, empty with an inf cost if there is no path
+    def plan(self, start, goal, radius=None):
+        self.checkLocations(start, goal)
+        stats = Stats(self.algorithm) if self.stats else None
+
+        t = time.perf_counter()
+        radius = self.radius if radius is None else radius
+        if self.cache is not None:
+            key = self.cacheKey(start, goal, radius)
+            cached = self.cache.get(key)
+            if cached is not None:
+                # nothing was expanded to answer this one
+                self.nits = 0
+                return Result(cached.path, cached.cost, 0, time.perf_counter() - t, cached.status)
+
+        grid = self.grid.inflated(radius)
+        self.state.reset()
+        self.nits = 0
+
+        # nothing can start or end inside a tree
+        if grid.blocked[grid.cell(*start)] or grid.blocked[grid.cell(*goal)]:
+            found = False
+        elif self.algorithm == "astar":
+            found, self.nits = Astar.search_grid(grid, self.state, start, goal,
+                                                 self.heuristic, self.max_its, stats)
+        elif self.algorithm == "dijkstra":
+            found, self.nits = Dijkstra.search_grid(grid, self.state, start, goal,
+                                                    self.max_its, stats)
+        elif self.algorithm == "jps":
+            found, self.nits = JPS.search_grid(grid, self.state, start, goal,
+                                               self.heuristic, self.max_its, stats)
+        else:
+            # bidirectional Dijkstra is bidirectional A* without a heuristic
+            heuristic = self.heuristic if self.algorithm == "biastar" else Astar.zero
+            self.back.reset()
+            found, self.nits = Bidirectional.search_grid(grid, self.state, self.back, start, goal,
+                                                         heuristic, self.max_its, stats)
+        t_search = time.perf_counter()
+
+        path, cost, status = self.outcome(grid, start, goal, found)
+        t_end = time.perf_counter()
+
+        if stats is not None:
+            stats.phases["construction"] = grid.build_time
+            stats.phases["search"] = t_search - t
+            stats.phases["recover_path"] = t_end - t_search
+            stats.export()
+
+        result = Result(path, cost, self.nits, t_end - t, status, stats)
+        if self.cache is not None:
+            self.cache.put(key, result)
+        return result
+
+    # plan step by step with the astar or dijkstra algorithm: a generator
+    # of the Expansions of a search from start to goal for a robot of a
+    # radius, see Astar.search_iter. the caller can stop whenever it
+    # likes, and pathTo gives the way to any cell reached so far. once
+    # the search ends self.result holds its Result, whose time includes
+    # the time the caller spent between steps
+    #
+    #     >>> for step in planner.plan_iter([0, 0], [99, 99]):
+    #     ...     if time.perf_counter() > deadline:
+    #     ...         break
+    #     >>> planner.result or planner.pathTo(step.location)
+    def plan_iter(self, start, goal, radius=None):
+        if self.algorithm not in ("astar", "dijkstra"):
+            raise ValueError(f"no step by step search for {self.algorithm!r}, use astar or dijkstra")
+        self.checkLocations(start, goal)
+
+        t = time.perf_counter()
+        self.result = None
+        self.start = start
+        grid = self.grid.inflated(self.radius if radius is None else radius)
+        self.state.reset()
+        self.nits = 0
+
+        if grid.blocked[grid.cell(*start)] or grid.blocked[grid.cell(*goal)]:
+            found = False
+        elif self.algorithm == "astar":
+            found, self.nits = yield from Astar.search_iter(grid, self.state, start, goal,
+                                                            self.heuristic, self.max_its)
+        else:
+            found, self.nits = yield from Dijkstra.search_iter(grid, self.state, start, goal,
+                                                               self.max_its)
+
+        path, cost, status = self.outcome(grid, start, goal, found)
+        self.result = Result(path, cost, self.nits, time.perf_counter() - t, status)
+
+    # the path from the start of the last plan_iter to a location its
+    # search has reached, as an (L, 2) array of [r, c] rows, or an empty
+    # array if it hasn't been reached
+    def pathTo(self, location):
+        return self.grid.getPath(location, self.state, self.start)
+
+    def checkLocations(self, start, goal):
+        for location in (start, goal):
+            if not (0 <= location[0] < self.grid.nrows and 0 <= location[1] < self.grid.ncols):
+                raise ValueError(f"{list(location)} is off the {self.grid.nrows}x{self.grid.ncols} board")
+
+    # (path, cost, status) of the search that just ran on a grid from
+    # start to goal
+    def outcome(self, grid, start, goal, found):
+        if found:
+            path = grid.getPath(goal, self.state, start)
+            if self.algorithm == "jps":
+                path = JPS.fill_path(path)
+            return path, self.state.getCost(grid.cell(*goal)), "destination reached"
+
+        max_its = Astar.MAX_ITS if self.max_its is None else self.max_its
+        if self.nits > max_its:
+            status = "couldn't reach destination in {} iterations".format(max_its)
+        else:
+            status = "destination can't be reached"
+        return np.empty((0, 2), dtype=np.intp), float("inf"), status
+
+    # key of a query in the PathCache. when the board has changed since
+    # the last query, the Results for the old board are dropped first
+    def cacheKey(self, start, goal, radius=None):
+        fingerprint = self.grid.fingerprint()
+        if fingerprint != self.fingerprint:
+            if self.fingerprint is not None:
+                self.cache.invalidate(self.fingerprint)
+            self.fingerprint = fingerprint
+        return (fingerprint, (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1])),
+                self.algorithm, self.heuristic, self.max_its, radius or None)
+
+    # answer a list of (start, goal) pairs, in order
+    def plan_many(self, pairs):
+        return [self.plan(start, goal) for start, goal in pairs]
+
+
+# plan on any board, a Board from Astar.py or Dijkstra.py or a Grid,
+# without printing anything. start and goal default to the board's own
+def plan(board, start=None, goal=None, algorithm="astar", heuristic=Astar.octile, stats=False,
+         radius=None):
+    if start is None:
+        start = board.start
+    if goal is None:
+        goal = board.goal
+
+    # Tile boards are converted, the search always runs on a Grid
+    board = Grid.from_board(board)
+
+    return Planner(board, algorithm, heuristic, stats=stats, radius=radius).plan(start, goal)
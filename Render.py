@@ -0,0 +1,134 @@
+import sys
+import numpy as np
+
+'''
+Console output for the planners
+
+The planners never print. Everything that shows a board, a path or the
+progress of a search on the console lives here and is only used when
+asked for, like the scripts' main() functions do:
+
+    >>> import Render
+    >>> result = Render.show("Astar", board, Astar(board))
+
+Works with a Board from Astar.py or Dijkstra.py and with a Grid.
+'''
+
+
+def _top_line(board):
+    sys.stdout.write("\n   ")
+    for _ in range(board.ncols):
+        sys.stdout.write("--")
+    print()
+
+
+def _bottom_lines(board):
+    # bottom line
+    sys.stdout.write("   ")
+    for _ in range(board.ncols):
+        sys.stdout.write("--")
+    print()
+
+    # column legend
+    sys.stdout.write("    ")
+    for num in range(board.ncols):
+        sys.stdout.write(str(num)+" ")
+    print()
+
+
+# show the board to the user, and optionally a path as a list of [r, c]
+# or an (L, 2) array
+def print_board(board, _path=()):
+    _path = set(map(tuple, np.asarray(_path, dtype=np.intp).reshape(-1, 2).tolist()))
+
+    _top_line(board)
+    for row in board.tiles[::-1]:
+        # row legend
+        if row[0].r < 10:
+            sys.stdout.write(" ")
+        sys.stdout.write(str(row[0].r)+" ")
+
+        # board content
+        for tile in row:
+            if (tile.r, tile.c) in _path:
+                sys.stdout.write("|@")
+            else:
+                sys.stdout.write("|"+tile.type)
+
+        sys.stdout.write("|\n")
+    _bottom_lines(board)
+
+
+# show the cost of every tile so far
+def print_distances(board):
+    _top_line(board)
+    for row in board.tiles[::-1]:
+        # row legend
+        if row[0].r < 10:
+            sys.stdout.write(" ")
+        sys.stdout.write(str(row[0].r)+" ")
+
+        # board content, Dijkstra's tiles call the cost a distance
+        for tile in row:
+            cost = tile.distance if hasattr(tile, "distance") else tile.cost
+            if cost == float("inf"):
+                sys.stdout.write(f"|  {cost}")
+            else:
+                sys.stdout.write("|%5.1f" % cost)
+        sys.stdout.write("|\n")
+    _bottom_lines(board)
+
+
+def print_text_path(path):
+    print("\nshortest path:")
+    sys.stdout.write("->".join(str(loc) for loc in np.asarray(path).tolist()))
+
+
+# on_iteration hook for Astar.run on a Board
+def show_astar_iteration(board, tile, costs, next_tile, f):
+    sorted_costs = sorted(costs, key=lambda x: x[0])
+    print("\ncurrent node: [{}, {}]".format(tile.r, tile.c))
+    sys.stdout.write("updated neighbors: ")
+    for tup in sorted_costs:
+        sys.stdout.write(f"{[tup[1].r,tup[1].c]} ")
+    sys.stdout.write("\nwith costs: ")
+    for tup in sorted_costs:
+        sys.stdout.write(f"{tup[0]:.4f} ")
+    sys.stdout.write("\n")
+    print(f"minimum cost: {f:.4f}")
+    print("selecting node: [{}, {}]".format(next_tile.r, next_tile.c))
+    print_distances(board)
+
+
+# on_iteration hook for Dijkstra.run on a Board
+def show_dijkstra_iteration(board, tile, nbs, nb_dists, thru_dists):
+    nb_locs = []
+    for nb in nbs:
+        nb_locs.append([nb.r, nb.c])
+    print("\ncurrent node: [{}, {}]".format(tile.r, tile.c))
+    print("{} neighbors: {}".format(len(nb_locs), nb_locs))
+    print("with distances: {}".format(
+        ['%.2f' % elem for elem in nb_dists]))
+    print("with total distances: {}".format(
+        ['%.2f' % elem for elem in thru_dists]))
+    print_distances(board)
+
+
+# run a planner (an Astar or Dijkstra object) and show the board before,
+# the outcome, and the board with the path after. returns the Result
+def show(name, board, planner, on_iteration=None):
+    print(f"getting ready for {name} algorithm . . .")
+
+    # show the starting board
+    print_board(board)
+
+    print("iterating . . .")
+    result = planner.run(on_iteration)
+    print("stopping: " + result.status)
+
+    # print results
+    if result.found:
+        print_text_path(result.path)
+        print_board(board, result.path)
+
+    return result
@@ -0,0 +1,275 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from Grid import Grid, random_raster
+from Planner import Planner
+import Astar
+import Parallel
+
+'''
+Planning service for asyncio servers
+
+A search is plain Python that holds the thread it runs on until it's
+done, so calling a planner from a coroutine stalls the whole event
+loop. A PlanningService runs the searches on a bounded pool of worker
+threads (or processes, see Parallel.py) and hands back awaitables:
+
+    >>> async with PlanningService(grid, workers=4) as service:
+    ...     result = await service.plan([0, 0], [99, 99], timeout=0.5)
+
+so that a burst of requests can't pile up unbounded work:
+
+  - identical requests (same start and goal) that are in flight at the
+    same time share one search
+  - at most `workers` searches run at once, the rest wait their turn in
+    the order they came in
+  - past max_pending waiting requests, new ones are turned away at once
+    with Overloaded instead of making everyone wait longer
+  - a request that isn't answered within its timeout raises
+    asyncio.TimeoutError. a search nobody is waiting for any more is
+    dropped before it starts
+
+threads keep the event loop free but share one core. processes search in
+parallel on a copy of the raster (and cell costs) in shared memory.
+
+HOW TO RUN THIS CODE:
+
+    $ python Service.py     # burst load from stand-in clients
+'''
+
+# PARAMETERS
+#############
+WORKERS = None  # None is one worker per core
+MAX_PENDING = 256  # requests waiting for a worker before new ones are turned away
+TIMEOUT = None  # seconds a request may take by default, None for no limit
+#############
+BOARD_SIZE = [256, 256]
+TREE_DENSITY = 0.2
+SEED = 0
+NBURSTS = 10
+BURST_SIZE = 100  # requests sent at once
+BURST_INTERVAL = 0.2  # seconds between bursts
+POPULAR = 0.5  # share of requests that go to a few popular (start, goal) pairs
+#############
+
+
+class Overloaded(RuntimeError):
+    pass
+
+
+# one search in flight and the requests waiting for it
+class Flight:
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+
+        # counted in PlanningService.npending until it gets a worker slot
+        # or is dropped
+        self.pending = True
+        self.started = False
+
+
+class PlanningService:
+    def __init__(self, grid, algorithm="astar", heuristic=Astar.octile, max_its=None,
+                 workers=WORKERS, max_pending=MAX_PENDING, timeout=TIMEOUT, processes=False):
+        self.grid = grid
+        self.algorithm = algorithm
+        self.heuristic = heuristic
+        self.max_its = max_its
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        # every worker searches with a Planner of its own, search state
+        # can't be shared
+        self.shm = None
+        self.weights_shm = None
+        if processes:
+            self.shm = Parallel.share(grid.obstacles)
+            if grid.weights is not None:
+                self.weights_shm = Parallel.share(grid.weights)
+            self.executor = ProcessPoolExecutor(
+                self.workers, initializer=Parallel._init_queries,
+                initargs=(self.shm.name, grid.size, algorithm, heuristic,
+                          None if self.weights_shm is None else self.weights_shm.name, max_its))
+        else:
+            self.local = threading.local()
+            self.executor = ThreadPoolExecutor(self.workers)
+
+        # (start, goal) -> Flight of the searches in flight
+        self.inflight = {}
+
+        # worker slots, made on the event loop of the first request, the
+        # number of searches that haven't got one yet and of searches
+        # holding one. searches for the free slots don't wait, the others
+        # count against max_pending
+        self.slots = None
+        self.npending = 0
+        self.nrunning = 0
+
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.dropped = 0
+
+    async def __aenter__(self):
+        return self
+
+    # close on a thread of the loop's default executor, so the event loop
+    # keeps running while the workers finish their searches
+    async def __aexit__(self, *exc):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    # stop the workers, after the searches they are running, and release
+    # the shared memory once they have exited
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for shm in (self.shm, self.weights_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.shm = None
+        self.weights_shm = None
+
+    # search on a worker thread, with that thread's own Planner
+    def search(self, start, goal):
+        planner = getattr(self.local, "planner", None)
+        if planner is None:
+            planner = self.local.planner = Planner(self.grid, self.algorithm, self.heuristic, self.max_its)
+        return planner.plan(start, goal)
+
+    # wait for a worker slot and run one search in it
+    async def run(self, key, flight):
+        await self.slots.acquire()
+        self.nrunning += 1
+        try:
+            self.unqueue(flight)
+            flight.started = True
+            loop = asyncio.get_running_loop()
+            if self.shm is not None:
+                return await loop.run_in_executor(self.executor, Parallel._plan_query, key)
+            return await loop.run_in_executor(self.executor, self.search, *key)
+        finally:
+            self.nrunning -= 1
+            self.slots.release()
+
+    # plan from start to goal without blocking the event loop. returns the
+    # Result of Planner.plan, raises Overloaded if too many requests are
+    # waiting already and asyncio.TimeoutError after timeout seconds
+    # (the service's timeout by default)
+    async def plan(self, start, goal, timeout=None):
+        for location in (start, goal):
+            if not (0 <= location[0] < self.grid.nrows and 0 <= location[1] < self.grid.ncols):
+                raise ValueError(f"{list(location)} is off the {self.grid.nrows}x{self.grid.ncols} board")
+        if timeout is None:
+            timeout = self.timeout
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.workers)
+
+        self.requests += 1
+        key = ((int(start[0]), int(start[1])), (int(goal[0]), int(goal[1])))
+        flight = self.inflight.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            waiting = self.npending - (self.workers - self.nrunning)
+            if waiting >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded(f"{waiting} requests are waiting for a worker already")
+            self.npending += 1
+            flight = Flight()
+            flight.task = asyncio.ensure_future(self.run(key, flight))
+            flight.task.add_done_callback(lambda _: self.land(key, flight))
+            self.inflight[key] = flight
+
+        flight.waiters += 1
+        try:
+            # shielded, so one request timing out leaves the search to the
+            # others waiting for it
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.started and not flight.task.done():
+                # nobody wants this search any more and it hasn't started
+                flight.task.cancel()
+                self.land(key, flight)
+                self.dropped += 1
+
+    # a search is over, requests for the same key get a new one
+    def land(self, key, flight):
+        if self.inflight.get(key) is flight:
+            del self.inflight[key]
+        self.unqueue(flight)
+
+    # a search no longer waits for a worker slot
+    def unqueue(self, flight):
+        if flight.pending:
+            flight.pending = False
+            self.npending -= 1
+
+
+# stand-in clients: NBURSTS bursts of BURST_SIZE requests, BURST_INTERVAL
+# apart, a POPULAR share of them to a few popular (start, goal) pairs and
+# the rest random. returns the latency of every answered request and
+# how many failed, by reason
+async def load(service, nbursts=NBURSTS, burst_size=BURST_SIZE, interval=BURST_INTERVAL,
+               popular=POPULAR, timeout=None, seed=SEED):
+    rng = random.Random(seed)
+    free = np.argwhere(service.grid.obstacles == 0).tolist()
+    hot = [(rng.choice(free), rng.choice(free)) for _ in range(5)]
+
+    latencies = []
+    failures = {"overloaded": 0, "timeout": 0}
+
+    async def client(start, goal):
+        t = time.perf_counter()
+        try:
+            await service.plan(start, goal, timeout)
+            latencies.append(time.perf_counter() - t)
+        except Overloaded:
+            failures["overloaded"] += 1
+        except asyncio.TimeoutError:
+            failures["timeout"] += 1
+
+    clients = []
+    for _ in range(nbursts):
+        for _ in range(burst_size):
+            start, goal = rng.choice(hot) if rng.random() < popular else (rng.choice(free), rng.choice(free))
+            clients.append(asyncio.ensure_future(client(start, goal)))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*clients)
+    return latencies, failures
+
+
+def main():
+    start, goal, raster = random_raster(BOARD_SIZE, TREE_DENSITY, SEED)
+    grid = Grid(BOARD_SIZE, start, goal, None, obstacles=raster)
+
+    async def run(processes, max_pending, timeout):
+        async with PlanningService(grid, max_pending=max_pending, processes=processes) as service:
+            t = time.perf_counter()
+            latencies, failures = await load(service, timeout=timeout)
+            elapsed = time.perf_counter() - t
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+        print(f"{'processes' if processes else 'threads':9} max_pending={max_pending:<5} "
+              f"timeout={timeout}: {len(latencies)} answered in {elapsed:.1f} s, "
+              f"p50 {p50:.0f} ms, p99 {p99:.0f} ms, {service.coalesced} coalesced, "
+              f"{failures['overloaded']} turned away, {failures['timeout']} timed out, "
+              f"{service.dropped} searches dropped")
+
+    for processes in (False, True):
+        asyncio.run(run(processes, max_pending=NBURSTS * BURST_SIZE, timeout=None))
+        asyncio.run(run(processes, max_pending=MAX_PENDING, timeout=1.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import time
+import numpy as np
+
+from Grid import Grid, OFFSETS, random_raster
+import Dijkstra
+
+'''
+Wavefront distance transform
+
+Cost-to-go from a goal (or a set of goals) to every cell of the board,
+for coverage planning and potential fields, without running Dijkstra one
+cell at a time. The wavefront spreads out from the goals the way a
+brushfire does, a whole ring of cells at a time, as a handful of numpy
+operations per ring: no move costs less than the cheapest cell
+(Grid.min_weight), so every cell within that much of the closest one not
+finished yet can't get any closer and is finished too (Dial's buckets).
+Those cells are expanded at once in all eight directions, their
+neighbors keep the cheapest way in and join the wavefront. That is what
+Dijkstra gets, up to rounding of the sums, with one step of Python per
+ring instead of per cell.
+
+    >>> import Wavefront
+    >>> distance = Wavefront.distance_transform(grid, [goal])
+    >>> path = Wavefront.descend(grid, distance, start)
+
+moves cost the same both ways, so the distance from the goals to a cell
+is also the cost-to-go from the cell to the nearest goal.
+
+HOW TO RUN THIS CODE:
+
+    $ python Wavefront.py
+'''
+
+# PARAMETERS
+#############
+BOARD_SIZES = [[256, 256], [512, 512], [1024, 1024]]
+TREE_DENSITY = 0.2
+SEED = 0
+#############
+
+
+# distance from the nearest of a list of [r, c] sources to every cell of
+# a Grid (or Board) as an (nrows, ncols) float64 array, inf where no
+# source can be reached. the same distances as Dijkstra.distance_field
+def distance_transform(grid, sources):
+    return _spread(Grid.from_board(grid), [sources])[0]
+
+
+# distance from each of a list of [r, c] sources on its own to every cell
+# of a Grid, as an (nsources, nrows, ncols) float64 array. all of them
+# spread at once, each on its own copy of the board, so this is for
+# small boards (the clusters of HPA.py) with a few sources
+def distance_fields(grid, sources):
+    sources = np.asarray(sources, dtype=np.intp).reshape(-1, 2)
+    return _spread(grid, sources[:, None, :])
+
+
+# spread a wavefront from every list of [r, c] sources in layers, each on
+# its own copy of the board. returns an (nlayers, nrows, ncols) array
+def _spread(grid, layers):
+    nrows, ncols = grid.nrows, grid.ncols
+    nlayers = len(layers)
+
+    # pad with a border of cells nothing can get to, so every cell has
+    # eight neighbors, and stack the layers one above the other. penalty
+    # is inf where no move may end, 0 elsewhere
+    height = nrows + 2
+    width = ncols + 2
+    penalty = np.full((height, width), float("inf"))
+    penalty[1:-1, 1:-1] = np.where(grid.obstacles != 0, float("inf"), 0.0)
+    penalty = np.tile(penalty.reshape(-1), nlayers)
+    w = None
+    if grid.weights is not None:
+        w = np.ones((height, width))
+        w[1:-1, 1:-1] = grid.weights
+        w = np.tile(w.reshape(-1), nlayers)
+    deltas = np.array([dr * width + dc for dr, dc, _ in OFFSETS])
+    steps = np.array([cost for _, _, cost in OFFSETS])
+
+    d = np.full(nlayers * height * width, float("inf"))
+    front = []
+    for layer, sources in enumerate(layers):
+        sources = np.asarray(sources, dtype=np.intp).reshape(-1, 2)
+        front.append((layer * height + sources[:, 0] + 1) * width + sources[:, 1] + 1)
+    front = np.unique(np.concatenate(front))
+    d[front] = 0.0
+
+    # queued[cell] once the cell has joined the wavefront. owner is
+    # scratch space for dropping repeats from a list of cells
+    queued = np.zeros(len(d), dtype=bool)
+    queued[front] = True
+    owner = np.zeros(len(d), dtype=np.intp)
+
+    while len(front):
+        # finish the ring of cells no other cell can get closer
+        dist = d[front]
+        done = dist < dist.min() + grid.min_weight
+        ring = front[done]
+        front = front[~done]
+
+        # expand the ring in all eight directions at once
+        nbs = ring[:, None] + deltas
+        if w is None:
+            thru = d[ring][:, None] + steps
+        else:
+            thru = d[ring][:, None] + steps * 0.5 * (w[ring][:, None] + w[nbs])
+        thru += penalty[nbs]
+        better = thru < d[nbs]
+        nbs = nbs[better]
+        np.minimum.at(d, nbs, thru[better])
+
+        # new neighbors join the wavefront, each once
+        nbs = nbs[~queued[nbs]]
+        index = np.arange(len(nbs))
+        owner[nbs] = index
+        nbs = nbs[owner[nbs] == index]
+        queued[nbs] = True
+        front = np.concatenate((front, nbs))
+
+    return d.reshape(nlayers, height, width)[:, 1:-1, 1:-1].copy()
+
+
+# walk downhill on a distance field from a location to the nearest
+# source, each time to the neighbor the rest of the way is cheapest from.
+# returns an (L, 2) array of [r, c] rows, empty if no source can be
+# reached. a source on a tree can't be stepped onto, the path stops next
+# to it
+def descend(grid, distance, location):
+    if distance[location[0], location[1]] == float("inf"):
+        return np.empty((0, 2), dtype=np.intp)
+
+    flat = memoryview(np.ascontiguousarray(distance).reshape(-1))
+    cell = grid.cell(*location)
+    cells = [cell]
+    while flat[cell] > 0.0:
+        nb = min(((dist + flat[nb], nb) for nb, dist in grid.getNeighbors(cell)), default=(0.0, -1))[1]
+        if nb == -1 or flat[nb] >= flat[cell]:
+            break
+        cell = nb
+        cells.append(cell)
+    cells = np.array(cells, dtype=np.intp)
+    return np.stack(np.divmod(cells, grid.ncols), axis=1)
+
+
+def main():
+    for size in BOARD_SIZES:
+        start, goal, raster = random_raster(size, TREE_DENSITY, SEED)
+        grid = Grid(size, start, goal, None, obstacles=raster)
+
+        t = time.perf_counter()
+        distance = distance_transform(grid, [goal])
+        t_wave = time.perf_counter() - t
+
+        t = time.perf_counter()
+        field, _ = Dijkstra.distance_field(grid, goal)
+        t_dijkstra = time.perf_counter() - t
+
+        reached = np.isfinite(field)
+        same = np.array_equal(reached, np.isfinite(distance))
+        error = np.abs(field[reached] - distance[reached]).max()
+        print(f"{size[0]}x{size[1]}: wavefront {t_wave:.2f} s, Dijkstra {t_dijkstra:.2f} s "
+              f"({t_dijkstra / t_wave:.0f}x), same cells reached: {same}, max difference {error:.2e}")
+
+
+if __name__ == "__main__":
+    main()